@@ -0,0 +1,3 @@
+"""
+Benchmarks for urbaani_sanakirja_bot, run from the repository root with python -m benchmarks.<name>
+"""
@@ -0,0 +1,73 @@
+"""
+Compare database size and lookup latency of plain and compressed definition text
+
+usage: python -m benchmarks.compression [--db words.db] [--synthetic WORDS] [--lookups N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from word_database import WordDatabase
+from benchmarks.corpus import make_synthetic_database, copy_database, database_words
+
+def measure_lookups(path: str, words: list, lookups: int) -> list:
+    """
+    Time lookups that read the text of the first definition, like the bot shows it
+
+    returns: sorted list of latencies in seconds
+    """
+    db = WordDatabase(path)
+    timings = []
+    for word in words[:lookups]:
+        start = time.perf_counter()
+        definitions = db.get_definitions(word)
+        if definitions:
+            _ = definitions[0][3], definitions[0][4]
+        timings.append(time.perf_counter() - start)
+    db.close()
+    return sorted(timings)
+
+def percentile(timings: list, p: float) -> float:
+    """
+    Return the p:th percentile of sorted timings in microseconds
+    """
+    return timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6
+
+def main():
+    """
+    Run the compression benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", help="word database to benchmark, copied before compressing")
+    parser.add_argument("--synthetic", type=int, default=20000,
+                        help="number of words in a generated database if --db is not given")
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, "plain.db")
+        compressed = os.path.join(tmp, "compressed.db")
+        if args.db:
+            copy_database(args.db, plain)
+        else:
+            make_synthetic_database(plain, args.synthetic)
+        copy_database(plain, compressed)
+
+        start = time.perf_counter()
+        db = WordDatabase(compressed)
+        db.compress_existing()
+        db.close()
+        migration = time.perf_counter() - start
+
+        words = database_words(plain)
+        random.Random(1).shuffle(words)
+        print(f"migration took {migration:.1f} s")
+        for name, path in (("plain", plain), ("compressed", compressed)):
+            timings = measure_lookups(path, words, args.lookups)
+            print(f"{name:>10}: {os.path.getsize(path) / 1e6:8.2f} MB  "
+                  f"p50 {percentile(timings, 0.5):7.1f} us  "
+                  f"p99 {percentile(timings, 0.99):7.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Word databases for benchmarks
+"""
+import random
+import sqlite3
+from word_database import WordDatabase
+
+SYLLABLES = ["ka", "la", "mu", "ti", "ro", "sä", "pe", "ny", "jo", "ko", "vi", "hä", "ur", "ba",
+             "ni", "ss", "aa", "kki", "tt", "ö"]
+COMMON = ["on", "ja", "se", "kun", "joka", "tai", "ei", "niin", "jos", "sitä", "mutta",
+          "esim.", "eli", "vähän", "tosi", "kaveri", "juttu", "tyyppi", "sana", "kun"]
+
+def fake_word(rng: random.Random) -> str:
+    """
+    Return a random word-like string
+    """
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5)))
+
+def fake_text(rng: random.Random, vocabulary: list, length: int) -> str:
+    """
+    Return a random sentence-like text of length tokens
+    """
+    tokens = [rng.choice(COMMON) if rng.random() < 0.4 else rng.choice(vocabulary)
+              for _ in range(length)]
+    return " ".join(tokens).capitalize() + "."
+
+def make_synthetic_database(path: str, words: int, seed: int = 1) -> list:
+    """
+    Fill a word database with words random words, each with 1-4 definitions
+
+    returns: list of the words in the database
+    """
+    rng = random.Random(seed)
+    vocabulary = [fake_word(rng) for _ in range(2000)]
+    db = WordDatabase(path)
+    created = []
+    batch = []
+    for _ in range(words):
+        title = fake_word(rng).capitalize()
+        created.append(title.lower())
+        for _ in range(rng.randint(1, 4)):
+            batch.append((
+                title.lower(), title,
+                fake_text(rng, vocabulary, rng.randint(10, 80)),
+                fake_text(rng, vocabulary, rng.randint(0, 40)),
+                fake_word(rng), "1.1.2020",
+                str(rng.randint(0, 500)), str(rng.randint(0, 100)), ""
+            ))
+        if len(batch) >= 5000:
+            db.insert_definitions(batch)
+            batch = []
+    db.insert_definitions(batch)
+    db.close()
+    return created
+
+def copy_database(source: str, target: str):
+    """
+    Copy a SQLite database using the backup API
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+def database_words(path: str) -> list:
+    """
+    Return the distinct words of a word database
+    """
+    conn = sqlite3.connect(path)
+    words = [row[0] for row in conn.execute("SELECT DISTINCT word FROM words")]
+    conn.close()
+    return words
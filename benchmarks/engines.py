@@ -0,0 +1,96 @@
+"""
+Compare lookup latency and memory use of the SQLite and in-memory lookup engines
+
+Each engine is measured in its own process so resident set sizes are not mixed up.
+
+usage: python -m benchmarks.engines [--db words.db] [--synthetic WORDS] [--lookups N]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from word_database import WordDatabase
+from memory_engine import MemoryDictionary
+from benchmarks.corpus import make_synthetic_database, database_words
+
+def rss_mb() -> float:
+    """
+    Return the current resident set size of this process in megabytes
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        # peak instead of current usage where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+def run_engine(name: str, db_path: str, index_path: str, words: list, results):
+    """
+    Load one engine, look up every word and report timings and memory use
+    """
+    baseline = rss_mb()
+    start = time.perf_counter()
+    db = WordDatabase(db_path)
+    if name == "sqlite":
+        engine = db
+    elif name == "memory":
+        engine = MemoryDictionary.from_database(db)
+    else:
+        # the engine file is written by the parent, like a deploy would ship it
+        engine = MemoryDictionary.open(index_path)
+    load_time = time.perf_counter() - start
+    loaded = rss_mb()
+    timings = []
+    for word in words:
+        start = time.perf_counter()
+        engine.get_definitions(word)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    results.put((name, load_time, loaded - baseline, rss_mb() - baseline, timings))
+
+def main():
+    """
+    Run the engine benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", help="word database to benchmark")
+    parser.add_argument("--synthetic", type=int, default=50000,
+                        help="number of words in a generated database if --db is not given")
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(tmp, "words.db")
+            make_synthetic_database(db_path, args.synthetic)
+        words = database_words(db_path)
+        db = WordDatabase(db_path)
+        index_path = os.path.join(tmp, "words.idx")
+        MemoryDictionary.save(db, index_path)
+        db.close()
+        rng = random.Random(1)
+        # mostly words that exist, some misses
+        lookups = [rng.choice(words) if rng.random() < 0.8 else f"missing{i}"
+                   for i in range(args.lookups)]
+
+        print(f"{len(words)} words, {args.lookups} lookups")
+        print(f"{'engine':>8} {'load s':>8} {'RSS load MB':>12} {'RSS end MB':>11} "
+              f"{'p50 us':>8} {'p99 us':>8}")
+        results = multiprocessing.Queue()
+        for name in ("sqlite", "memory", "mmap"):
+            process = multiprocessing.Process(target=run_engine,
+                                              args=(name, db_path, index_path, lookups, results))
+            process.start()
+            name, load_time, rss_load, rss_end, timings = results.get()
+            process.join()
+            p50 = timings[len(timings) // 2] * 1e6
+            p99 = timings[int(len(timings) * 0.99)] * 1e6
+            print(f"{name:>8} {load_time:8.2f} {rss_load:12.1f} {rss_end:11.1f} "
+                  f"{p50:8.1f} {p99:8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Offline load generator for the bot handlers
+
+Feeds a mix of fake updates (messages, inline query keystroke bursts and
+Previous/Next callback presses) through the real handlers and update processor.
+Bot API calls go to a stub that answers after a configurable latency.
+Reports throughput and latency percentiles per concurrency level and database size.
+Inline queries superseded by a newer keystroke are never answered, so they are
+counted separately and left out of the percentiles.
+
+usage: python -m benchmarks.load [--concurrency 1 16 64] [--db-sizes 1000 50000]
+                                 [--users 200] [--actions 10] [--api-latency 0.05]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest
+from word_database import WordDatabase
+from lookup_log import LookupLog
+from update_processor import ChatOrderedUpdateProcessor
+from benchmarks.corpus import make_synthetic_database
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "load_test_bot"}
+
+class StubRequest(BaseRequest):
+    """
+    Bot API request that answers every method locally after a delay
+    """
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        # ids of the inline queries that were answered
+        self.answered_inline = set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method in ("sendMessage", "editMessageText"):
+            await asyncio.sleep(self.latency)
+            result = {"message_id": 1, "date": int(time.time()),
+                      "chat": {"id": params.get("chat_id", 1), "type": "private"},
+                      "text": params.get("text", "")}
+        else:
+            await asyncio.sleep(self.latency)
+            if api_method == "answerInlineQuery":
+                self.answered_inline.add(params.get("inline_query_id"))
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+class UpdateFactory:
+    """
+    Create realistic fake updates for a user
+    """
+    def __init__(self, app):
+        self.app = app
+        self.update_id = 0
+
+    def make(self, **payload) -> Update:
+        """
+        Create an update with the given update payload
+        """
+        self.update_id += 1
+        return Update.de_json({"update_id": self.update_id, **payload}, self.app.bot)
+
+    def message(self, user_id: int, text: str) -> Update:
+        """
+        Create a private text message update
+        """
+        return self.make(message={
+            "message_id": self.update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"}})
+
+    def inline_query(self, user_id: int, text: str) -> Update:
+        """
+        Create an inline query update
+        """
+        return self.make(inline_query={
+            "id": str(self.update_id), "query": text, "offset": "",
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"}})
+
+    def callback(self, user_id: int, word: str, index: int) -> Update:
+        """
+        Create a Previous/Next button press update
+        """
+        return self.make(callback_query={
+            "id": str(self.update_id), "chat_instance": str(user_id),
+            "data": f"def:{word}:{index}",
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "message": {"message_id": 1, "date": int(time.time()), "text": "...",
+                        "chat": {"id": user_id, "type": "private"}}})
+
+class Results:
+    """
+    Latencies of answered updates and the number of superseded inline queries
+    """
+    def __init__(self):
+        self.latencies = []
+        self.superseded = 0
+
+async def process(app, update: Update, results: Results):
+    """
+    Process one update like the application would and record its latency,
+    or count it as superseded if it was an inline query that was never answered
+    """
+    start = time.perf_counter()
+    await app.update_processor.process_update(update, app.process_update(update))
+    if update.inline_query and update.inline_query.id not in app.bot.request.answered_inline:
+        results.superseded += 1
+    else:
+        results.latencies.append(time.perf_counter() - start)
+
+async def simulate_user(app, factory: UpdateFactory, user_id: int, words: list,
+                        actions: int, rng: random.Random, results: Results):
+    """
+    Run one user's session of lookups, inline typing bursts and button presses
+    """
+    tasks = []
+    for _ in range(actions):
+        word = rng.choice(words)
+        roll = rng.random()
+        if roll < 0.3:
+            await process(app, factory.message(user_id, word), results)
+        elif roll < 0.8:
+            # a keystroke burst, updates arrive before earlier ones are answered
+            for length in range(1, len(word) + 1):
+                tasks.append(asyncio.create_task(
+                    process(app, factory.inline_query(user_id, word[:length]), results)))
+                await asyncio.sleep(rng.uniform(0.02, 0.08))
+        else:
+            for index in range(rng.randint(1, 4)):
+                await process(app, factory.callback(user_id, word, index), results)
+    await asyncio.gather(*tasks)
+
+def import_bot(directory: str):
+    """
+    Import the bot module without touching the configured word database
+
+    The bot opens its database when imported, so it is pointed to a scratch file in directory.
+
+    returns: the bot module
+    """
+    os.environ["WORD_DATABASE"] = os.path.join(directory, "import.db")
+    bot = importlib.import_module("bot")
+    bot.database.close()
+    return bot
+
+async def run_level(bot, db_path: str, words: list, concurrency: int, args) -> tuple:
+    """
+    Run the load with one concurrency limit
+
+    returns: tuple of (updates processed, superseded inline queries, seconds,
+             sorted latencies of the other updates)
+    """
+    bot.database = WordDatabase(db_path)
+    bot.engine = bot.database
+    bot.lookup_log = LookupLog(bot.database)
+    bot.word_cache.clear()
+
+    request = StubRequest(args.api_latency)
+    app = (
+        ApplicationBuilder()
+        .token("123456:LOADTEST")
+        .request(request)
+        .get_updates_request(StubRequest(0))
+        .concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+        .build()
+    )
+    app.add_handlers(bot.get_application_handlers())
+    await app.initialize()
+    factory = UpdateFactory(app)
+    rng = random.Random(1)
+    results = Results()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        simulate_user(app, factory, user_id, words, args.actions, random.Random(rng.random()),
+                      results)
+        for user_id in range(1000, 1000 + args.users)
+    ))
+    elapsed = time.perf_counter() - start
+    await app.shutdown()
+    bot.database.close()
+    count = len(results.latencies) + results.superseded
+    return count, results.superseded, elapsed, sorted(results.latencies)
+
+def percentile(latencies: list, p: float) -> float:
+    """
+    Return the p:th percentile of sorted latencies in milliseconds
+    """
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+
+def main():
+    """
+    Run the load test
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--db-sizes", type=int, nargs="+", default=[1000, 50000],
+                        help="number of words in the generated databases")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=10, help="actions per user")
+    parser.add_argument("--api-latency", type=float, default=0.05,
+                        help="seconds the stub Bot API takes to answer")
+    args = parser.parse_args()
+
+    print(f"{'words':>8} {'limit':>6} {'updates':>8} {'superseded':>10} {'upd/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = import_bot(tmp)
+        for size in args.db_sizes:
+            db_path = os.path.join(tmp, f"words_{size}.db")
+            words = make_synthetic_database(db_path, size)
+            for concurrency in args.concurrency:
+                count, superseded, elapsed, latencies = asyncio.run(
+                    run_level(bot, db_path, words, concurrency, args)
+                    )
+                print(f"{size:>8} {concurrency:>6} {count:>8} {superseded:>10} "
+                      f"{count / elapsed:8.1f} "
+                      f"{percentile(latencies, 0.5):8.1f} {percentile(latencies, 0.95):8.1f} "
+                      f"{percentile(latencies, 0.99):8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from telegram import (
     constants,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
+    InlineQuery,
     InlineQueryResultArticle,
     InputTextMessageContent
 )
@@ -20,33 +21,194 @@ from telegram.ext import (
     CallbackQueryHandler,
     InlineQueryHandler
 )
-from word_database import WordDatabase
-from scraper import scan_for_links, scan_for_words
+from word_database import WordDatabase, normalize_word
+from memory_engine import MemoryDictionary
+from lookup_log import LookupLog
+from word_cache import WordCache, load_snapshot, save_snapshot
+from scraper import scan_for_links, scan_for_new_links, scan_for_words, save_page_fingerprints
 
 logger = logging.getLogger(__name__)
 database = WordDatabase()
+# engine serving definition lookups, either the database itself or a MemoryDictionary
+engine = database
+lookup_log = LookupLog(database)
+word_cache = WordCache()
+# shared lookups in progress, keyed by what they compute
+_in_flight = {}
+# latest inline query task of each user
+_inline_tasks = {}
+# seconds without a newer inline query from the user before a query is logged as a lookup,
+# so the prefixes typed on the way to a word are not logged as misses
+INLINE_LOG_DELAY = 3.0
+# pending lookup log timer of the latest answered inline query of each user
+_inline_log_timers = {}
 
-async def run_scraper():
+async def run_scraper(full: bool = False):
     """
     Run scraper to get words for backend
+
+    Only new links are scraped unless full is set, a full scrape revisits every
+    word page and so also picks up definitions added to words scraped before.
     """
-    logger.info("Scanning for links...")
-    links = await scan_for_links()
-    logger.info("Scanning for definitions...")
+    if full:
+        logger.info("Scanning for all links...")
+        links, changed_pages = await scan_for_links(), []
+    else:
+        logger.info("Scanning for new links...")
+        links, changed_pages = await scan_for_new_links(database)
+    logger.info("Scanning for definitions of %d links...", len(links))
     await scan_for_words(links, database)
+    save_page_fingerprints(database, changed_pages)
     logger.info("Word scan finished!")
+    await refresh_lookups()
+
+async def refresh_lookups():
+    """
+    Rebuild the memory engine, if it is used, and the cache after definitions have changed
+    """
+    if isinstance(engine, MemoryDictionary):
+        await asyncio.to_thread(use_memory_engine, engine.path)
+    # cached definitions may be outdated, reload the currently cached words into a new
+    # cache in a worker thread, the old one keeps serving lookups meanwhile
+    refreshed = WordCache(word_cache.max_words)
+    await asyncio.to_thread(refreshed.warm, engine, word_cache.words(), build_reply)
+    word_cache.replace(refreshed)
+
+async def periodic_reload(interval: float = 10 * 60):
+    """
+    Periodically refresh lookups if another process, eg. the standalone scraper
+    or a dictionary import, has written to the database
+    """
+    version = await asyncio.to_thread(database.data_version)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await asyncio.to_thread(database.data_version)
+            if current != version:
+                version = current
+                logger.info("Database changed by another process, refreshing lookups")
+                await refresh_lookups()
+        except Exception as e:
+            logger.error("Exception when refreshing lookups: %s", e)
 
-async def periodic_scrape():
+async def periodic_scrape(full_every: int = 4):
     """
     Periodically scrape for new words to add to database
+
+    Every full_every:th scrape is a full one (0: never), see run_scraper.
     """
+    runs = 0
     while True:
+        runs += 1
         try:
-            await run_scraper()
+            await run_scraper(full=bool(full_every) and runs % full_every == 0)
         except Exception as e:
-            logging.error("Exception when scraping: %s", e)
+            logger.error("Exception when scraping: %s", e)
         await asyncio.sleep(7 * 24 * 60 * 60)
 
+def use_memory_engine(path: str = None):
+    """
+    Build a MemoryDictionary from the database and serve lookups from it
+
+    If path is given the engine is written to that file and mmap'd instead of kept on the heap.
+    """
+    global engine # pylint: disable=W0603
+    if path:
+        MemoryDictionary.save(database, path)
+        new_engine = MemoryDictionary.open(path)
+    else:
+        new_engine = MemoryDictionary.from_database(database)
+    engine = new_engine
+    logger.info("Serving lookups from memory engine with %d definitions", new_engine.rows)
+
+def warm_cache(snapshot_path: str, time_budget: float = 5.0) -> int:
+    """
+    Load definitions and replies for the words in the hot set snapshot into the cache
+
+    returns: number of words loaded
+    """
+    words = load_snapshot(snapshot_path, word_cache.max_words)
+    loaded = word_cache.warm(engine, words, build_reply, time_budget)
+    logger.info("Warmed cache with %d of %d snapshot words", loaded, len(words))
+    return loaded
+
+async def save_cache_snapshot(snapshot_path: str):
+    """
+    Write the current hot set (most looked up and most recently used words) to a snapshot
+    """
+    hot_words = await asyncio.to_thread(database.get_hot_words, word_cache.max_words)
+    hot_words = [word for word, _, _ in hot_words]
+    words = list(dict.fromkeys(hot_words + word_cache.words()))[:word_cache.max_words]
+    await asyncio.to_thread(save_snapshot, snapshot_path, words)
+
+async def periodic_snapshot(snapshot_path: str, interval: float = 60 * 60):
+    """
+    Periodically write the hot set snapshot
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await lookup_log.flush()
+            await save_cache_snapshot(snapshot_path)
+        except Exception as e:
+            logger.error("Exception when saving cache snapshot: %s", e)
+
+async def single_flight(key, func, *args):
+    """
+    Run coroutine function func(*args) once for all concurrent callers using the same key
+
+    The shared task is shielded so that cancelling one caller does not cancel it for the others,
+    it is cancelled only when the last caller waiting for it is cancelled.
+
+    returns: the shared result
+    """
+    flight = _in_flight.get(key)
+    if flight is None:
+        flight = {"task": asyncio.ensure_future(func(*args)), "waiters": 0}
+        _in_flight[key] = flight
+        def done(t):
+            if _in_flight.get(key) is flight:
+                del _in_flight[key]
+            if not t.cancelled():
+                t.exception() # mark exception as retrieved even if all callers went away
+        flight["task"].add_done_callback(done)
+    flight["waiters"] += 1
+    try:
+        return await asyncio.shield(flight["task"])
+    finally:
+        flight["waiters"] -= 1
+        if not flight["waiters"] and not flight["task"].done():
+            # nobody is waiting for the result anymore, later callers start a new task
+            flight["task"].cancel()
+            del _in_flight[key]
+
+async def get_definitions(word: str) -> list:
+    """
+    Get definitions for word, using the cache when possible
+
+    Concurrent lookups of the same word share a single database fetch,
+    which runs in a worker thread to keep the event loop responsive.
+
+    returns: list of tuples containing word definitions
+    """
+    key = normalize_word(word)
+    definitions = word_cache.get(key)
+    if definitions is None:
+        definitions = await single_flight(
+            ("definitions", key), asyncio.to_thread, engine.get_definitions, word
+            )
+        if definitions and word_cache.get(key) is None:
+            word_cache.put(key, definitions)
+    return definitions
+
+def get_reply(word: str, definitions: list, index: int) -> str:
+    """
+    Get the formatted reply for a definition, using the cache when possible
+
+    returns: formatted reply string
+    """
+    return word_cache.get_reply(normalize_word(word), definitions, index, build_reply)
+
 def build_reply(word: tuple) -> str:
     """
     Format reply string when given a word object
@@ -107,12 +269,13 @@ async def word_handler(update: Update, context: CallbackContext): # pylint: disa
     """
     Handle word input from the user
     """
-    definitions = database.get_definitions(update.message.text)
+    definitions = await get_definitions(update.message.text)
+    lookup_log.record(update.message.text, bool(definitions))
     if not definitions:
         await update.message.reply_text("Sanaa ei löytynyt")
         return
     index = 0
-    out_str = build_reply(definitions[index])
+    out_str = get_reply(update.message.text, definitions, index)
     keyboard = build_keyboard(definitions, index)
 
     await update.message.reply_text(
@@ -138,14 +301,14 @@ async def callback_handler(update: Update, context: CallbackContext): # pylint:
         await query.edit_message_text("Invalid callback data")
         return
 
-    definitions = database.get_definitions(word)
+    definitions = await get_definitions(word)
     if not definitions:
         await query.edit_message_text("Sanaa ei löytynyt")
         return
 
     index %= len(definitions)
 
-    message = build_reply(definitions[index])
+    message = get_reply(word, definitions, index)
     keyboard = build_keyboard(definitions, index)
     await query.edit_message_text(
         message,
@@ -153,19 +316,14 @@ async def callback_handler(update: Update, context: CallbackContext): # pylint:
         parse_mode=constants.ParseMode.HTML
         )
 
-async def inline_query(update: Update, context: CallbackContext): # pylint: disable=W0613
+def build_inline_results(query: str, definitions: list) -> list:
     """
-    Handle the inline querying of words
-    """
-    query = update.inline_query.query.strip().lower()
-
-    if not query:
-        return
-
-    definitions = database.get_definitions(query)
+    Format inline query results for definitions
 
+    returns: list of InlineQueryResultArticle
+    """
     if not definitions:
-        results = [
+        return [
             InlineQueryResultArticle(
                 id=str(uuid4()),
                 title="Ei tuloksia",
@@ -174,35 +332,91 @@ async def inline_query(update: Update, context: CallbackContext): # pylint: disa
                     )
             )
         ]
-    else:
-        results = [
-            InlineQueryResultArticle(
-                id = str(uuid4()),
-                title = f"Selitys #{i+1}",
-                description = explanation[:50] + "..." if len(explanation) > 50 else explanation,
-                input_message_content = InputTextMessageContent(
-                    f"Käyttäjältä: {user} | <i>Postattu {date}</i>\n"
-                    f"<b>{title}</b>\n\n"
-                    f"ℹ️ <b>Selitys</b>\n"
-                    f"{explanation}\n\n"
-                    f"📍<b>Esimerkit</b>\n"
-                    f"<i>{example if example else 'N/A'}</i>\n\n"
-                    f"👍 {likes} | 👎 {dislikes}\n",
-                    parse_mode="HTML"
-                )
+    return [
+        InlineQueryResultArticle(
+            id = str(uuid4()),
+            title = f"Selitys #{i+1}",
+            description = explanation[:50] + "..." if len(explanation) > 50 else explanation,
+            input_message_content = InputTextMessageContent(
+                f"Käyttäjältä: {user} | <i>Postattu {date}</i>\n"
+                f"<b>{title}</b>\n\n"
+                f"ℹ️ <b>Selitys</b>\n"
+                f"{explanation}\n\n"
+                f"📍<b>Esimerkit</b>\n"
+                f"<i>{example if example else 'N/A'}</i>\n\n"
+                f"👍 {likes} | 👎 {dislikes}\n",
+                parse_mode="HTML"
             )
-            for i, (id,
-                    word,
-                    title,
-                    explanation,
-                    example,
-                    user,
-                    date,
-                    likes,
-                    dislikes,
-                    labels) in enumerate(definitions)
-        ]
-    await update.inline_query.answer(results, cache_time=1)
+        )
+        for i, (id,
+                word,
+                title,
+                explanation,
+                example,
+                user,
+                date,
+                likes,
+                dislikes,
+                labels) in enumerate(definitions)
+    ]
+
+async def load_inline_results(query: str) -> tuple:
+    """
+    Look up and format inline query results for query
+
+    returns: tuple of (definitions, results)
+    """
+    definitions = await get_definitions(query)
+    return definitions, build_inline_results(query, definitions)
+
+async def answer_inline_query(inline: InlineQuery, query: str) -> bool:
+    """
+    Answer an inline query, sharing the lookup with concurrent identical queries
+
+    returns: boolean indicating if definitions were found
+    """
+    definitions, results = await single_flight(("inline", query), load_inline_results, query)
+    await inline.answer(results, cache_time=1)
+    return bool(definitions)
+
+def log_inline_query(user_id: int, query: str, hit: bool):
+    """
+    Log the final inline query of a user as a lookup
+    """
+    _inline_log_timers.pop(user_id, None)
+    lookup_log.record(query, hit)
+
+async def inline_query(update: Update, context: CallbackContext): # pylint: disable=W0613
+    """
+    Handle the inline querying of words
+    """
+    query = update.inline_query.query.strip().lower()
+
+    if not query:
+        return
+
+    # a newer query from the same user supersedes the previous one
+    user_id = update.inline_query.from_user.id
+    previous = _inline_tasks.get(user_id)
+    if previous is not None:
+        previous.cancel()
+    timer = _inline_log_timers.pop(user_id, None)
+    if timer is not None:
+        timer.cancel()
+    task = asyncio.ensure_future(answer_inline_query(update.inline_query, query))
+    _inline_tasks[user_id] = task
+    try:
+        hit = await task
+        _inline_log_timers[user_id] = asyncio.get_running_loop().call_later(
+            INLINE_LOG_DELAY, log_inline_query, user_id, query, hit
+            )
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        logger.debug("Inline query '%s' superseded", query)
+    finally:
+        if _inline_tasks.get(user_id) is task:
+            del _inline_tasks[user_id]
 
 def get_application_handlers():
     """
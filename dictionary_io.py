@@ -0,0 +1,146 @@
+"""
+Streaming export and import of the word dictionary
+
+The dump format is line-delimited JSON, gzip compressed when the file name ends with .gz.
+The first line is a header naming the columns, every following line is one definition
+as a JSON array in that column order.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from word_database import WordDatabase
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "urbaani-sanakirja-dump"
+FORMAT_VERSION = 1
+COLUMNS = ["word", "title", "explanation", "examples", "user", "date",
+           "upvotes", "downvotes", "labels"]
+
+def open_dump(path: str, mode: str, compressed: bool):
+    """
+    Open a dump file for text reading or writing
+    """
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def export_dictionary(db: WordDatabase, path: str, chunk_size: int = 1000) -> int:
+    """
+    Write all definitions to a dump file without loading the whole table into memory
+
+    returns: number of definitions written
+    """
+    count = 0
+    tmp_path = path + ".tmp"
+    with open_dump(tmp_path, "w", path.endswith(".gz")) as f:
+        f.write(json.dumps({"format": FORMAT_NAME, "version": FORMAT_VERSION,
+                            "columns": COLUMNS}) + "\n")
+        for row in db.iter_definitions(chunk_size):
+            # drop the id, it is assigned again on import
+            f.write(json.dumps(row[1:10], ensure_ascii=False, separators=(",", ":")) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def dump_identity(path: str) -> str:
+    """
+    Identify a dump file by its size and modification time, so progress recorded
+    for one dump is not applied to another one written to the same path
+
+    returns: identity string
+    """
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def read_progress(progress_path: str, identity: str) -> int:
+    """
+    Read the number of already imported lines of the dump identified by identity
+    from a progress file
+
+    returns: number of lines to skip
+    """
+    try:
+        with open(progress_path, encoding="utf-8") as f:
+            progress = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except ValueError:
+        progress = None
+    if not isinstance(progress, dict) or progress.get("dump") != identity:
+        logger.warning("Ignoring progress in %s recorded for another dump", progress_path)
+        return 0
+    return progress.get("lines", 0)
+
+def write_progress(progress_path: str, identity: str, lines: int):
+    """
+    Record the number of imported lines of the dump identified by identity to a progress file
+    """
+    with open(progress_path, "w", encoding="utf-8") as f:
+        json.dump({"dump": identity, "lines": lines}, f)
+
+def import_dictionary(db: WordDatabase, path: str, batch_size: int = 1000,
+                      resume: bool = True) -> int:
+    """
+    Insert definitions from a dump file in batches
+
+    Progress is recorded after every batch to a .progress file next to the dump,
+    so an interrupted import of the same dump continues where it left off. Definitions that
+    already exist are skipped, so re-importing a dump is safe.
+
+    returns: number of definitions inserted
+    """
+    progress_path = path + ".progress"
+    identity = dump_identity(path)
+    skip = read_progress(progress_path, identity) if resume else 0
+    inserted = 0
+    done = 0
+    batch = []
+    with open_dump(path, "r", path.endswith(".gz")) as f:
+        header = json.loads(f.readline())
+        if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dump format in {path}")
+        if header.get("columns") != COLUMNS:
+            raise ValueError(f"Unexpected dump columns in {path}")
+        for line in f:
+            done += 1
+            if done <= skip:
+                continue
+            batch.append(tuple(json.loads(line)))
+            if len(batch) >= batch_size:
+                inserted += db.insert_definitions(batch)
+                write_progress(progress_path, identity, done)
+                batch = []
+        if batch:
+            inserted += db.insert_definitions(batch)
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return inserted
+
+def main():
+    """
+    Command line interface for exporting and importing the dictionary
+    """
+    parser = argparse.ArgumentParser(description="Export or import the word dictionary")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="dump file, gzip compressed if it ends with .gz")
+    parser.add_argument("--db", help="word database file (default: WORD_DATABASE or words.db)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore saved import progress and start from the beginning")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    database = WordDatabase(args.db)
+    if args.command == "export":
+        written = export_dictionary(database, args.path, args.batch_size)
+        logger.info("Exported %d definitions to %s", written, args.path)
+    else:
+        added = import_dictionary(database, args.path, args.batch_size, not args.restart)
+        logger.info("Imported %d new definitions from %s", added, args.path)
+    database.close()
+
+if __name__ == "__main__":
+    main()
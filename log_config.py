@@ -0,0 +1,130 @@
+"""
+Non-blocking logging setup for urbaani_sanakirja_bot
+
+Log records are put on a queue by the calling thread and written to the
+console and a rotating log file by a background listener thread.
+"""
+import copy
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler
+)
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as single line JSON objects
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class LogQueueHandler(QueueHandler):
+    """
+    Queue handler that keeps the traceback of a record apart from its message
+
+    QueueHandler.prepare merges the traceback into the message, which would put it
+    inside the message field of JSON output.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # format arguments now, they may change before the listener thread gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # tracebacks hold references to frames, keep only their text
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most burst records with the same logger, level and message
+    template per interval seconds
+
+    The first record let through after a suppressed period mentions how many were dropped.
+    """
+    def __init__(self, burst: int = 10, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # key -> [window start, records in window, suppressed records]
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if len(self.windows) > 10000:
+                    # forget old windows so unique messages cannot grow this without bound
+                    self.windows = {k: w for k, w in self.windows.items()
+                                    if now - w[0] < self.interval}
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+def setup_logging(path: str = "urbaani_sanakirja_bot.log", level: int = logging.INFO,
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                  rotate_when: str = None, json_output: bool = False,
+                  burst: int = 10, interval: float = 60.0) -> QueueListener:
+    """
+    Route all logging through a queue to a background thread writing to the console and
+    a log file rotated by size, or by time if rotate_when (eg. "midnight") is given
+
+    returns: the started QueueListener, stop it on shutdown to flush remaining records
+    """
+    if rotate_when:
+        file_handler = TimedRotatingFileHandler(path, when=rotate_when,
+                                                backupCount=backup_count, encoding="utf-8")
+    else:
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                           backupCount=backup_count, encoding="utf-8")
+    formatter = JsonFormatter() if json_output else logging.Formatter(LOG_FORMAT)
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(log_queue)
+    # drop repeated records before they are queued, so error storms cost almost nothing
+    queue_handler.addFilter(RateLimitFilter(burst, interval))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    return listener
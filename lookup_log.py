@@ -0,0 +1,86 @@
+"""
+Asynchronous batched log of word lookups for urbaani_sanakirja_bot
+"""
+import asyncio
+import logging
+import time
+from word_database import WordDatabase, normalize_word
+
+logger = logging.getLogger(__name__)
+
+class LookupLog:
+    """
+    In-memory queue of lookup events that is flushed to the database in batches
+
+    Handlers only call record(), which never touches SQLite. The run() task
+    drains the queue periodically and writes aggregated counts per word
+    in a worker thread, so a busy database does not stall the event loop.
+    """
+    def __init__(self, db: WordDatabase, flush_interval: float = 10.0,
+                 max_batch: int = 5000, max_queue: int = 100000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def record(self, word: str, hit: bool):
+        """
+        Queue a lookup event, dropping it if the queue is full
+        """
+        try:
+            self.queue.put_nowait((normalize_word(word), hit, int(time.time())))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def drain(self) -> dict:
+        """
+        Take up to max_batch events off the queue and aggregate them per word
+
+        returns: dict of word -> [hits, misses, last_seen]
+        """
+        counts = {}
+        for _ in range(self.max_batch):
+            try:
+                word, hit, seen = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            entry = counts.setdefault(word, [0, 0, seen])
+            entry[0 if hit else 1] += 1
+            entry[2] = max(entry[2], seen)
+        return counts
+
+    async def flush(self) -> int:
+        """
+        Write all queued events to the database
+
+        returns: number of distinct words written
+        """
+        written = 0
+        while True:
+            counts = self.drain()
+            if not counts:
+                break
+            await asyncio.to_thread(
+                self.db.record_lookups,
+                [(word, hits, misses, seen) for word, (hits, misses, seen) in counts.items()]
+                )
+            written += len(counts)
+        if self.dropped:
+            logger.warning("Dropped %d lookup events, queue was full", self.dropped)
+            self.dropped = 0
+        return written
+
+    async def run(self):
+        """
+        Periodically flush queued lookup events to the database
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error("Exception when flushing lookup log: %s", e)
+        finally:
+            await self.flush()
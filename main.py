@@ -3,19 +3,23 @@ Main module for running the bot
 """
 import asyncio
 import logging
+import signal
 from os import getenv
 from telegram.ext import ApplicationBuilder
 from dotenv import load_dotenv
-from bot import get_application_handlers, periodic_scrape
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler("urbaani_sanakirja_bot.log"),
-        logging.StreamHandler()
-    ]
+from bot import (
+    get_application_handlers,
+    periodic_scrape,
+    periodic_reload,
+    periodic_snapshot,
+    warm_cache,
+    save_cache_snapshot,
+    use_memory_engine,
+    lookup_log
 )
+from update_processor import ChatOrderedUpdateProcessor
+from log_config import setup_logging
+from profiling import Profiler, instrument_handlers
 
 logger = logging.getLogger(__name__)
 
@@ -24,22 +28,81 @@ async def main():
     Main function for running the bot
     """
     load_dotenv()
+    log_listener = setup_logging(
+        path=getenv("LOG_FILE", "urbaani_sanakirja_bot.log"),
+        max_bytes=int(getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(getenv("LOG_BACKUP_COUNT", "5")),
+        rotate_when=getenv("LOG_ROTATE_WHEN"),
+        json_output=getenv("LOG_JSON", "0") == "1"
+    )
+    try:
+        await run_bot()
+    finally:
+        # also when startup fails, so the listener thread writes the error and exits
+        log_listener.stop()
+
+async def run_bot():
+    """
+    Start the bot and keep it running until cancelled
+    """
     token = getenv("TELEGRAM_BOT_TOKEN")
     if not token:
         raise ValueError("Failed to get TOKEN")
 
-    app = ApplicationBuilder().token(token).build()
-    app.add_handlers(get_application_handlers())
+    snapshot_path = getenv("CACHE_SNAPSHOT", "hot_words.json")
+    concurrent_updates = int(getenv("CONCURRENT_UPDATES", "64"))
+
+    app = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(ChatOrderedUpdateProcessor(concurrent_updates))
+        .build()
+    )
+    handlers = get_application_handlers()
+    if getenv("PROFILING", "0") == "1":
+        # opt-in: handler timings, /profile for admins and SIGUSR1 start a capture
+        profiler = Profiler(getenv("PROFILE_DIR", "."),
+                            float(getenv("PROFILE_SLOW_CALLBACK", "0.1")))
+        profile_seconds = float(getenv("PROFILE_SECONDS", "30"))
+        instrument_handlers(handlers, profiler.timings)
+        admin_ids = [int(i) for i in getenv("PROFILE_ADMIN_IDS", "").split(",") if i.strip()]
+        if admin_ids:
+            # before the word handler, which would also match the command text
+            app.add_handler(profiler.command_handler(admin_ids, profile_seconds))
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, profiler.start_capture, profile_seconds
+            )
+    app.add_handlers(handlers)
 
     await app.initialize()
     await app.start()
-
-    asyncio.create_task(periodic_scrape())
+    lookup_log_task = asyncio.create_task(lookup_log.run())
 
     try:
+        if getenv("WORD_ENGINE", "sqlite") == "memory":
+            use_memory_engine(getenv("WORD_ENGINE_FILE"))
+
+        # load the hot set before polling so the first lookups are served from memory
+        warm_cache(snapshot_path)
+
+        # scraping can be left to the standalone scraper (python scraper.py)
+        if getenv("PERIODIC_SCRAPE", "1") == "1":
+            # every FULL_SCRAPE_EVERY:th weekly scrape revisits known words for new definitions
+            asyncio.create_task(periodic_scrape(int(getenv("FULL_SCRAPE_EVERY", "4"))))
+        # pick up definitions written by other processes, eg. the standalone scraper
+        reload_interval = float(getenv("RELOAD_INTERVAL", "600"))
+        if reload_interval > 0:
+            asyncio.create_task(periodic_reload(reload_interval))
+        asyncio.create_task(periodic_snapshot(snapshot_path))
+
         await app.updater.start_polling(drop_pending_updates=True)
         await asyncio.Event().wait()
     finally:
+        # the lookup log task writes the remaining events when cancelled
+        lookup_log_task.cancel()
+        await asyncio.gather(lookup_log_task, return_exceptions=True)
+        await save_cache_snapshot(snapshot_path)
         await app.stop()
         await app.shutdown()
 
@@ -0,0 +1,166 @@
+"""
+Read-only in-memory dictionary engine for serving word lookups
+
+All definitions are packed into a single buffer: an array of row ids, an array of
+field offsets, null flags and one block of UTF-8 text. The buffer can be kept in memory or
+written to a file and mmap'd. Rows are only decoded into tuples when their word is
+looked up, so the engine costs little more than the size of the text itself.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from word_database import WordDatabase, lookup_keys, normalize_word
+
+MAGIC = b"USMD"
+VERSION = 2
+# magic, version, number of rows, length of text data, padded to 24 bytes
+# so the 8 byte id and offset arrays after it are aligned in the mapped file
+HEADER = struct.Struct("<4sIIQ4x")
+# text fields of a definition row after the id
+FIELDS = 9
+
+class _WordEntry:
+    """
+    Location of the rows of one word in the word ordered row list
+    """
+    __slots__ = ("start", "count")
+
+    def __init__(self, start: int, count: int):
+        self.start = start
+        self.count = count
+
+def build_buffer(db: WordDatabase) -> bytes:
+    """
+    Pack all definitions of a word database into the engine buffer format
+
+    returns: buffer bytes
+    """
+    rows = 0
+    ids = array("q")
+    offsets = array("Q", [0])
+    nulls = array("H")
+    data = bytearray()
+    for row in db.iter_definitions():
+        rows += 1
+        ids.append(row[0])
+        mask = 0
+        for field in range(FIELDS):
+            value = row[field + 1]
+            if value is None:
+                mask |= 1 << field
+            else:
+                data += str(value).encode("utf-8")
+            offsets.append(len(data))
+        nulls.append(mask)
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, rows, len(data)),
+        ids.tobytes(), offsets.tobytes(), nulls.tobytes(), data
+    ])
+
+class MemoryDictionary:
+    """
+    Read-only word lookup engine with the same get_definitions interface as WordDatabase
+    """
+    def __init__(self, buffer, mapped_file=None, path: str = None):
+        self._mmap = mapped_file
+        # engine file the buffer is mapped from, None if it is kept on the heap
+        self.path = path
+        self._view = memoryview(buffer)
+        magic, version, rows, data_len = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a dictionary engine buffer")
+        pos = HEADER.size
+        self._ids = self._view[pos:pos + rows * 8].cast("q")
+        pos += rows * 8
+        self._offsets = self._view[pos:pos + (rows * FIELDS + 1) * 8].cast("Q")
+        pos += (rows * FIELDS + 1) * 8
+        self._nulls = self._view[pos:pos + rows * 2].cast("H")
+        pos += rows * 2
+        self._data = self._view[pos:pos + data_len]
+        self.rows = rows
+        self._order, self.index = self._build_index()
+
+    @classmethod
+    def from_database(cls, db: WordDatabase) -> "MemoryDictionary":
+        """
+        Build an in-memory engine from a word database
+        """
+        return cls(build_buffer(db))
+
+    @classmethod
+    def open(cls, path: str) -> "MemoryDictionary":
+        """
+        Open an engine file written by save() using mmap
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, mapped, path)
+
+    @staticmethod
+    def save(db: WordDatabase, path: str):
+        """
+        Write an engine file for a word database
+
+        The file is replaced atomically, so engines that have the old file mapped keep working.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(build_buffer(db))
+        os.replace(tmp_path, path)
+
+    def _field(self, row: int, field: int) -> str:
+        """
+        Decode one text field of a row
+        """
+        if self._nulls[row] & (1 << field):
+            return None
+        i = row * FIELDS + field
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def _build_index(self) -> tuple:
+        """
+        Order rows by normalized word and map each word to its consecutive rows in that order
+
+        returns: tuple of (row order array, word index dict)
+        """
+        words = [sys.intern(normalize_word(self._field(row, 0))) for row in range(self.rows)]
+        # rows are stored in id order and the sort is stable, so ids stay ordered within a word
+        order = array("I", sorted(range(self.rows), key=words.__getitem__))
+        index = {}
+        for position, row in enumerate(order):
+            entry = index.get(words[row])
+            if entry is None:
+                index[words[row]] = _WordEntry(position, 1)
+            else:
+                entry.count += 1
+        return order, index
+
+    def get_definitions(self, word: str) -> list:
+        """
+        Get definitions for word, matched by its normalized form (see lookup_keys)
+
+        returns: list of tuples containing word definitions
+        """
+        entry = None
+        for key in lookup_keys(word):
+            entry = self.index.get(key)
+            if entry is not None:
+                break
+        if entry is None:
+            return []
+        return [
+            (self._ids[row], *(self._field(row, field) for field in range(FIELDS)))
+            for row in self._order[entry.start:entry.start + entry.count]
+        ]
+
+    def close(self):
+        """
+        Release the buffer and close the mapped file if there is one
+        """
+        self.index = {}
+        for view in (self._ids, self._offsets, self._nulls, self._data, self._view):
+            view.release()
+        if self._mmap is not None:
+            self._mmap.close()
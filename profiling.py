@@ -0,0 +1,201 @@
+"""
+On-demand profiling of the running bot
+
+A capture profiles the event loop thread with cProfile for a number of seconds,
+records callbacks that block the loop longer than a threshold (asyncio debug mode)
+and writes both to a file together with the slowest recent handler calls.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from collections import deque
+from functools import wraps
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, filters
+
+logger = logging.getLogger(__name__)
+
+class HandlerTimings:
+    """
+    Keeps the durations of the most recent calls of each handler
+    """
+    def __init__(self, window: int = 1000):
+        self.window = window
+        # handler name -> deque of (duration, finished at, description)
+        self.calls = {}
+
+    def record(self, name: str, duration: float, description: str = ""):
+        """
+        Record one handler call
+        """
+        calls = self.calls.get(name)
+        if calls is None:
+            calls = self.calls[name] = deque(maxlen=self.window)
+        calls.append((duration, time.time(), description))
+
+    def report(self, slowest: int = 10) -> str:
+        """
+        Format call counts, median and slowest recent calls per handler
+
+        returns: report text
+        """
+        lines = []
+        for name, calls in sorted(self.calls.items()):
+            durations = sorted(call[0] for call in calls)
+            lines.append(f"{name}: {len(durations)} recent calls, "
+                         f"p50 {durations[len(durations) // 2] * 1e3:.1f} ms, "
+                         f"max {durations[-1] * 1e3:.1f} ms")
+            for duration, finished, description in sorted(calls, reverse=True)[:slowest]:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished))
+                lines.append(f"    {duration * 1e3:8.1f} ms  {stamp}  {description}")
+        return "\n".join(lines)
+
+def describe_update(update: object) -> str:
+    """
+    Short description of an update for timing reports
+    """
+    if not isinstance(update, Update):
+        return type(update).__name__
+    if update.inline_query:
+        return f"inline query {update.inline_query.query[:30]!r}"
+    if update.callback_query:
+        return f"callback {str(update.callback_query.data)[:30]!r}"
+    if update.message:
+        return f"message {str(update.message.text)[:30]!r}"
+    return f"update {update.update_id}"
+
+def timed(callback, name: str, timings: HandlerTimings):
+    """
+    Wrap a handler callback so its duration is recorded in timings
+    """
+    @wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            timings.record(name, time.perf_counter() - start, describe_update(update))
+    return wrapper
+
+def instrument_handlers(handlers: list, timings: HandlerTimings) -> list:
+    """
+    Record the duration of every call of the given handlers
+
+    returns: the same handlers
+    """
+    for handler in handlers:
+        handler.callback = timed(handler.callback, handler.callback.__name__, timings)
+    return handlers
+
+class _SlowCallbackHandler(logging.Handler):
+    """
+    Collects the slow callback warnings asyncio logs in debug mode
+    """
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.messages.append(message)
+
+class Profiler:
+    """
+    Captures profiles of the event loop on demand
+    """
+    def __init__(self, directory: str = ".", slow_callback: float = 0.1,
+                 timings: HandlerTimings = None):
+        self.directory = directory
+        self.slow_callback = slow_callback
+        self.timings = timings if timings is not None else HandlerTimings()
+        self.running = False
+        # capture started by start_capture, kept so it is not garbage collected while running
+        self._task = None
+
+    async def capture(self, seconds: float) -> str:
+        """
+        Profile the event loop for seconds and write the results to a file
+
+        returns: path of the written file, or None if a capture is already running
+        """
+        if self.running:
+            return None
+        self.running = True
+        loop = asyncio.get_running_loop()
+        debug, threshold = loop.get_debug(), loop.slow_callback_duration
+        slow_callbacks = _SlowCallbackHandler()
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(slow_callbacks)
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback
+        profile = cProfile.Profile()
+        logger.info("Profiling the event loop for %.0f seconds", seconds)
+        try:
+            profile.enable()
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            loop.set_debug(debug)
+            loop.slow_callback_duration = threshold
+            asyncio_logger.removeHandler(slow_callbacks)
+            self.running = False
+        path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.report(profile, slow_callbacks.messages, seconds))
+        logger.info("Wrote profile to %s", path)
+        return path
+
+    def report(self, profile: cProfile.Profile, slow_callbacks: list, seconds: float) -> str:
+        """
+        Format a capture
+
+        returns: report text
+        """
+        stats_output = io.StringIO()
+        stats = pstats.Stats(profile, stream=stats_output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        return "\n\n".join([
+            f"Event loop profile over {seconds:.0f} s",
+            f"== Slow callbacks (over {self.slow_callback * 1e3:.0f} ms) ==\n"
+            + ("\n".join(slow_callbacks) or "none"),
+            "== Slowest recent handler calls ==\n" + (self.timings.report() or "none"),
+            "== cProfile of the event loop thread, by cumulative time ==\n"
+            + stats_output.getvalue(),
+        ])
+
+    def start_capture(self, seconds: float):
+        """
+        Start a capture in the background, eg. from a signal handler
+        """
+        self._task = asyncio.get_running_loop().create_task(self.capture(seconds))
+
+    def command_handler(self, admin_ids: list, default_seconds: float = 30) -> CommandHandler:
+        """
+        Create a /profile [seconds] command handler restricted to admin_ids
+        """
+        async def profile(update: Update, context: CallbackContext):
+            try:
+                seconds = float(context.args[0]) if context.args else default_seconds
+            except ValueError:
+                await update.message.reply_text("Käyttö: /profile [sekunnit]")
+                return
+            if self.running:
+                await update.message.reply_text("Profilointi on jo käynnissä")
+                return
+            await update.message.reply_text(f"Profiloidaan {seconds:.0f} sekuntia...")
+
+            async def capture_and_reply():
+                path = await self.capture(seconds)
+                if path is None:
+                    # another capture started while the reply was being sent
+                    await update.message.reply_text("Profilointi on jo käynnissä")
+                else:
+                    await update.message.reply_text(f"Profiili tallennettu: {path}")
+            # do not hold up the admin's other updates while capturing
+            context.application.create_task(capture_and_reply())
+        return CommandHandler("profile", profile, filters=filters.User(user_id=admin_ids))
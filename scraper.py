@@ -1,6 +1,8 @@
 """
 Scraping functions for bot backend
 """
+import asyncio
+import hashlib
 import logging
 import aiohttp
 from bs4 import BeautifulSoup
@@ -23,7 +25,7 @@ async def fetch(session, url: str):
                 return None
             return await r.text()
     except Exception as e:
-        logging.error(e)
+        logger.error("Failed to fetch %s: %s", url, e)
         return None
 
 def parse_votes(vote_str: str) -> int:
@@ -35,81 +37,298 @@ def parse_votes(vote_str: str) -> int:
         return int(float(vote_str.replace('k', '').replace(',', '.')) * 1000)
     return int(vote_str)
 
-async def scan_for_links() -> list:
+def parse_page_count(html: str) -> int:
     """
-    Scan for links to word definition pages
+    Parse the number of pages from the first page of a browse tab
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    links = soup.find_all('a')
+    page_links = [int(l.get("href").split("=")[-1]) for l in links if l.get("href").startswith("?page=")]
+    pages = 1
+    if len(page_links) > 0:
+        pages = max(page_links)
+    return pages
+
+def parse_word_links(html: str) -> list:
+    """
+    Parse the links to word definition pages on a browse page
+    """
+    psoup = BeautifulSoup(html, 'html.parser')
+    wordl = psoup.find_all('a')
+    return [l.get("href") for l in wordl if l.get("href").startswith("/word/")]
+
+def page_fingerprint(links: list) -> str:
+    """
+    Fingerprint the set of links on a browse page
+    """
+    return hashlib.sha1("\n".join(sorted(links)).encode("utf-8")).hexdigest()
+
+async def scan_for_links(tabs: list = None) -> list:
+    """
+    Scan for links to word definition pages in the given browse tabs (default: all)
     """
     word_links = []
     async with aiohttp.ClientSession() as session:
-        for tab in BROWSE_TABS:
+        for tab in tabs if tabs is not None else BROWSE_TABS:
             html = await fetch(session, BROWSE_ROOT_URL + tab)
             if not html:
                 continue
-            soup = BeautifulSoup(html, 'html.parser')
-            links = soup.find_all('a')
-            page_links = [int(l.get("href").split("=")[-1]) for l in links if l.get("href").startswith("?page=")]
-            pages = 1
-            if len(page_links) > 0:
-                pages = max(page_links)
+            pages = parse_page_count(html)
             for page in range(1, pages+1):
                 page_html = await fetch(session, BROWSE_ROOT_URL + tab + f"/?page={page}")
                 if not page_html:
                     continue
-                psoup = BeautifulSoup(page_html, 'html.parser')
-                wordl = psoup.find_all('a')
-                words_to_add = [l.get("href") for l in wordl if l.get("href").startswith("/word/")]
-                word_links.extend(words_to_add)
+                word_links.extend(parse_word_links(page_html))
     return word_links
 
-async def scan_for_words(links: list, db: WordDatabase):
+async def fetch_page_links(session, tab: str, page: int) -> list:
     """
-    Scan word definitions using a list of word page links
+    Fetch a browse page and parse its word links
+
+    returns: list of links, or None if the page could not be fetched
+    """
+    page_html = await fetch(session, BROWSE_ROOT_URL + tab + f"/?page={page}")
+    if not page_html:
+        return None
+    return parse_word_links(page_html)
+
+async def fetch_changed_ends(session, tab: str, pages: int, fingerprints: dict) -> dict:
+    """
+    Fetch the first and last browse page of a tab whose page count has not changed
+
+    returns: dict of page number -> links of the fetched pages,
+             or None if both pages are unchanged
+    """
+    if max(fingerprints, default=0) != pages:
+        return {}
+    ends = {page: await fetch_page_links(session, tab, page) for page in sorted({1, pages})}
+    if all(links is not None and page_fingerprint(links) == fingerprints.get(page)
+           for page, links in ends.items()):
+        return None
+    return ends
+
+async def scan_for_new_links(db: WordDatabase, tabs: list = None, stop_after: int = 5) -> tuple:
     """
+    Scan browse tabs for links that have not been scraped yet
+
+    A tab is skipped after fetching only its first and last page when the page count
+    and the fingerprints of both are unchanged: adding a word shifts the later links of
+    a browse listing, which changes the last page. Otherwise pages whose link set
+    fingerprint has not changed since the last scan are not checked for new links.
+    A tab is left early after stop_after changed pages in a
+    row without new links (None to always walk every page): such pages only have
+    known links shifted onto them by a new word on an earlier page. Unchanged
+    pages do not count towards this, so a change deep in a tab is still reached.
+
+    returns: tuple of (new links, list of (tab, page, fingerprint, links) for changed pages)
+    """
+    new_links = []
+    changed_pages = []
+    seen = set()
     async with aiohttp.ClientSession() as session:
-        for link in links:
-            html = await fetch(session, ROOT_URL + link)
+        for tab in tabs if tabs is not None else BROWSE_TABS:
+            html = await fetch(session, BROWSE_ROOT_URL + tab)
             if not html:
                 continue
-            soup = BeautifulSoup(html, "html.parser")
-            boxes = soup.find_all('div', {"class": "box"})
-            try:
-                header = boxes[0].find("h1")
-            except IndexError:
+            pages = parse_page_count(html)
+            fingerprints = db.get_page_fingerprints(tab)
+            if max(fingerprints, default=0) > pages:
+                # the tab has shrunk, forget the pages that are gone
+                db.delete_page_fingerprints(tab, pages)
+            ends = await fetch_changed_ends(session, tab, pages, fingerprints)
+            if ends is None:
+                logger.info("Tab %s has not changed, skipping it", tab)
                 continue
-            title = header.text
-            word = title.lower()
-            for box in boxes:
-                upvotes = box.find("button", {"class": "btn btn-vote-up rate-up"}).text.strip()
-                downvotes = box.find("button", { "class": "btn btn-vote-down rate-down"}).text.strip()
-                if parse_votes(upvotes) < parse_votes(downvotes):
+            without_new = 0
+            for page in range(1, pages+1):
+                if page in ends:
+                    links = ends.pop(page)
+                else:
+                    links = await fetch_page_links(session, tab, page)
+                if links is None:
+                    continue
+                fingerprint = page_fingerprint(links)
+                if fingerprint == fingerprints.get(page):
+                    continue
+                fresh = [link for link in db.filter_new_links(links) if link not in seen]
+                seen.update(fresh)
+                new_links.extend(fresh)
+                changed_pages.append((tab, page, fingerprint, links))
+                if fresh:
+                    without_new = 0
                     continue
-                explanation = box.find("p").text
-                examples = "\n\n".join([quote.text.strip() for quote in box.find_all("blockquote")])
-                user = box.find("span", {"class": "user"}).text
-                date = box.find("span", {"class": "datetime"}).text
-                labels = ", ".join([label.text.strip() for label in box.find_all(
-                    "span",{"class": ["label label-positive", "label label-negative"]})
-                    ])
-                db.insert_definition((
-                    word,
-                    title,
-                    explanation,
-                    examples,
-                    user,
-                    date,
-                    upvotes,
-                    downvotes,
-                    labels
-                    ))
+                without_new += 1
+                if stop_after and without_new >= stop_after:
+                    logger.info("No new links in tab %s after page %d, skipping %d pages",
+                                tab, page, pages - page)
+                    break
+    return new_links, changed_pages
+
+def save_page_fingerprints(db: WordDatabase, changed_pages: list):
+    """
+    Store the fingerprints of changed browse pages once all their links have been scraped
+
+    Pages with links that failed to scrape keep their old fingerprint, so they are checked again.
+    """
+    db.set_page_fingerprints([
+        (tab, page, fingerprint)
+        for tab, page, fingerprint, links in changed_pages
+        if not db.filter_new_links(links)
+    ])
+
+def parse_definitions(html: str) -> list:
+    """
+    Parse the definitions on a word page
+
+    returns: list of word objects ready to be inserted into the database
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    boxes = soup.find_all('div', {"class": "box"})
+    try:
+        header = boxes[0].find("h1")
+    except IndexError:
+        return []
+    title = header.text
+    word = title.lower()
+    definitions = []
+    for box in boxes:
+        upvotes = box.find("button", {"class": "btn btn-vote-up rate-up"}).text.strip()
+        downvotes = box.find("button", { "class": "btn btn-vote-down rate-down"}).text.strip()
+        if parse_votes(upvotes) < parse_votes(downvotes):
+            continue
+        explanation = box.find("p").text
+        examples = "\n\n".join([quote.text.strip() for quote in box.find_all("blockquote")])
+        user = box.find("span", {"class": "user"}).text
+        date = box.find("span", {"class": "datetime"}).text
+        labels = ", ".join([label.text.strip() for label in box.find_all(
+            "span",{"class": ["label label-positive", "label label-negative"]})
+            ])
+        definitions.append((
+            word,
+            title,
+            explanation,
+            examples,
+            user,
+            date,
+            upvotes,
+            downvotes,
+            labels
+            ))
+    return definitions
+
+async def scan_for_words(links: list, db: WordDatabase, concurrency: int = 1,
+                         batch_size: int = 100) -> int:
+    """
+    Scan word definitions using a list of word page links
+
+    Up to concurrency pages are fetched at once and definitions are written
+    to the database in batches of about batch_size. Links of scraped pages are
+    remembered as known together with their definitions.
+
+    returns: number of definitions inserted
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batch = []
+    scanned = []
+    inserted = 0
+
+    async def scan(session, link: str):
+        nonlocal batch, scanned, inserted
+        async with semaphore:
+            html = await fetch(session, ROOT_URL + link)
+        if not html:
+            return
+        batch.extend(parse_definitions(html))
+        scanned.append(link)
+        if len(batch) >= batch_size:
+            pending, batch = batch, []
+            inserted += db.insert_definitions(pending)
+            pending_links, scanned = scanned, []
+            db.add_known_links(pending_links)
+
+    async with aiohttp.ClientSession() as session:
+        # schedule in windows so a long link list does not create all tasks at once
+        window = max(concurrency * 4, 1)
+        for start in range(0, len(links), window):
+            await asyncio.gather(*(scan(session, link) for link in links[start:start + window]))
+    if batch:
+        inserted += db.insert_definitions(batch)
+    if scanned:
+        db.add_known_links(scanned)
+    return inserted
+
+def shard_tabs(tabs: list, shards: int, shard: int) -> list:
+    """
+    Pick the browse tabs belonging to one of shards evenly sized shards
+
+    returns: list of tabs
+    """
+    return tabs[shard::shards]
+
+def scrape_worker(tabs: list, db_name: str, concurrency: int, batch_size: int,
+                  full: bool = False, stop_after: int = 5) -> int:
+    """
+    Scrape the given tabs into the database, run in a worker process
+
+    Unless full is set only new links are scraped, see scan_for_new_links.
+
+    returns: number of definitions inserted
+    """
+    async def scrape():
+        db = WordDatabase(db_name)
+        try:
+            if full:
+                links = await scan_for_links(tabs)
+                changed_pages = []
+            else:
+                links, changed_pages = await scan_for_new_links(db, tabs, stop_after)
+            logger.info("Found %d links in tabs %s", len(links), ",".join(tabs))
+            inserted = await scan_for_words(links, db, concurrency, batch_size)
+            save_page_fingerprints(db, changed_pages)
+            return inserted
+        finally:
+            db.close()
+    return asyncio.run(scrape())
+
+def main():
+    """
+    Command line interface for scraping outside the bot process
+    """
+    # pylint: disable=import-outside-toplevel
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    parser = argparse.ArgumentParser(description="Scrape word definitions into the database")
+    parser.add_argument("--db", help="target word database file "
+                        "(default: WORD_DATABASE or words.db)")
+    parser.add_argument("--tabs", help="comma separated browse tabs to scrape (default: all)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes on this host")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="number of hosts the tabs are split between")
+    parser.add_argument("--shard", type=int, default=0, help="shard of this host, from 0")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="concurrent page fetches per worker")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="definitions per database write")
+    parser.add_argument("--full", action="store_true",
+                        help="scrape every link instead of only new ones")
+    parser.add_argument("--stop-after", type=int, default=5,
+                        help="leave a tab after this many pages without new links (0: never)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s [%(levelname)s] %(processName)s: %(message)s")
+
+    tabs = args.tabs.split(",") if args.tabs else BROWSE_TABS
+    tabs = shard_tabs(tabs, args.shards, args.shard)
+    workers = max(1, min(args.workers, len(tabs)))
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(scrape_worker, shard_tabs(tabs, workers, i), args.db,
+                            args.concurrency, args.batch_size, args.full, args.stop_after)
+            for i in range(workers)
+        ]
+        inserted = sum(future.result() for future in futures)
+    logger.info("Scrape finished, inserted %d definitions", inserted)
 
 if __name__ == "__main__":
-    import asyncio
-    async def main():
-        """
-        main
-        """
-        database = WordDatabase()
-        wlinks = await scan_for_links()
-        await scan_for_words(wlinks, database)
-        database.close()
-    asyncio.run(main())
+    main()
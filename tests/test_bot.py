@@ -1,6 +1,8 @@
 """
 Tests for the bot functionality module
 """
+import asyncio
+import threading
 from unittest.mock import AsyncMock, MagicMock
 import pytest
 from telegram import (
@@ -26,12 +28,27 @@ from bot import (
     word_handler,
     inline_query,
     get_application_handlers,
-    database
+    get_definitions,
+    single_flight,
+    database,
+    word_cache
 )
 
+from word_database import WordDatabase
+from memory_engine import MemoryDictionary
+
 # import bot for mock monkeypatching
 import bot
 
+@pytest.fixture(autouse=True)
+def clear_word_cache():
+    """
+    Make sure cached definitions do not leak between tests
+    """
+    word_cache.clear()
+    yield
+    word_cache.clear()
+
 
 # Test helper functions
 # Test build reply
@@ -367,6 +384,185 @@ async def test_inline_query_valid_definitions(monkeypatch):
     assert results[0].title == "Selitys #1"
     assert "Käyttäjältä: User | <i>Postattu dd.mm.yyyy</i>" in results[0].input_message_content.message_text # pylint: disable=C0301
 
+@pytest.mark.asyncio
+async def test_get_definitions_cached(monkeypatch):
+    """
+    Test that found definitions are served from the cache on repeated lookups
+    """
+    mock_definitions = [
+        (1, 'word', 'Word', 'Definition of word', 'Example of word usage',
+         'User', 'dd.mm.yyyy', '10', '10', 'Label2 (1), Label1 (1)'),
+    ]
+    mock_get_definitions = MagicMock(return_value=mock_definitions)
+    monkeypatch.setattr(database, "get_definitions", mock_get_definitions)
+
+    assert await get_definitions("Word") == mock_definitions
+    assert await get_definitions("word") == mock_definitions
+    mock_get_definitions.assert_called_once_with("Word")
+
+@pytest.mark.asyncio
+async def test_get_definitions_miss_not_cached(monkeypatch):
+    """
+    Test that words without definitions are not cached
+    """
+    mock_get_definitions = MagicMock(return_value=[])
+    monkeypatch.setattr(database, "get_definitions", mock_get_definitions)
+
+    assert not await get_definitions("missing")
+    assert not await get_definitions("missing")
+    assert mock_get_definitions.call_count == 2
+
+@pytest.mark.asyncio
+async def test_get_definitions_single_flight(monkeypatch):
+    """
+    Test that concurrent lookups of the same word share one database fetch
+    """
+    release = threading.Event()
+    mock_definitions = [(1, 'word')]
+    def slow_get_definitions(word): # pylint: disable=W0613
+        release.wait(1)
+        return mock_definitions
+    mock_get_definitions = MagicMock(side_effect=slow_get_definitions)
+    monkeypatch.setattr(database, "get_definitions", mock_get_definitions)
+
+    lookups = asyncio.gather(*(get_definitions(w) for w in ("word", "Word", "WORD")))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await lookups == [mock_definitions] * 3
+    mock_get_definitions.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled_by_last_waiter():
+    """
+    Test that the shared task keeps running while anyone waits for it
+    and is cancelled when its last waiter is cancelled
+    """
+    started, stopped = asyncio.Event(), asyncio.Event()
+    async def render():
+        started.set()
+        try:
+            await asyncio.sleep(1)
+        finally:
+            stopped.set()
+
+    first = asyncio.ensure_future(single_flight("render", render))
+    second = asyncio.ensure_future(single_flight("render", render))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not stopped.is_set()
+    second.cancel()
+    await asyncio.wait_for(stopped.wait(), 0.1)
+    assert not bot._in_flight # pylint: disable=W0212
+
+@pytest.mark.asyncio
+async def test_inline_query_superseded(monkeypatch):
+    """
+    Test that a newer inline query from the same user cancels the previous one
+    """
+    release = threading.Event()
+    def slow_get_definitions(word):
+        if word == "wo":
+            release.wait(1)
+        return []
+    monkeypatch.setattr(database, "get_definitions", slow_get_definitions)
+
+    def make_update(text):
+        mock_inline_query = AsyncMock(spec=InlineQuery)
+        mock_inline_query.query = text
+        mock_inline_query.from_user.id = 1
+        return AsyncMock(spec=Update, inline_query=mock_inline_query)
+
+    old_update = make_update("wo")
+    new_update = make_update("word")
+    mock_context = AsyncMock(spec=CallbackContext)
+
+    old_handler = asyncio.create_task(inline_query(old_update, mock_context))
+    await asyncio.sleep(0.01)
+    await inline_query(new_update, mock_context)
+    release.set()
+    await old_handler
+
+    old_update.inline_query.answer.assert_not_called()
+    new_update.inline_query.answer.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_inline_query_logs_only_final_query(monkeypatch):
+    """
+    Test that only the last inline query typed by a user is logged as a lookup
+    """
+    monkeypatch.setattr(database, "get_definitions", lambda word: [])
+    monkeypatch.setattr(bot, "INLINE_LOG_DELAY", 0.02)
+    record = MagicMock()
+    monkeypatch.setattr(bot.lookup_log, "record", record)
+    mock_context = AsyncMock(spec=CallbackContext)
+
+    for text in ("k", "ki", "kis", "kissa"):
+        mock_inline_query = AsyncMock(spec=InlineQuery)
+        mock_inline_query.query = text
+        mock_inline_query.from_user.id = 1
+        await inline_query(AsyncMock(spec=Update, inline_query=mock_inline_query),
+                           mock_context)
+    record.assert_not_called()
+    await asyncio.sleep(0.05)
+    record.assert_called_once_with("kissa", False)
+
+@pytest.mark.asyncio
+async def test_use_memory_engine(monkeypatch, tmp_path):
+    """
+    Test that lookups are served from the memory engine once it is enabled
+    """
+    test_db = WordDatabase(":memory:")
+    test_db.insert_definition(('word', 'Word', 'Definition of word', '', 'User',
+                               'dd.mm.yyyy', '10', '10', ''))
+    monkeypatch.setattr(bot, "database", test_db)
+    monkeypatch.setattr(bot, "engine", test_db)
+
+    bot.use_memory_engine(str(tmp_path / "words.idx"))
+    assert isinstance(bot.engine, MemoryDictionary)
+    assert bot.engine.path == str(tmp_path / "words.idx")
+    assert await get_definitions("word") == test_db.get_definitions("word")
+    test_db.close()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("full", [False, True])
+async def test_run_scraper_full(monkeypatch, full):
+    """
+    Test that a full scrape revisits every link and a routine one only new links
+    """
+    monkeypatch.setattr(bot, "scan_for_links", AsyncMock(return_value=["/word/all"]))
+    monkeypatch.setattr(bot, "scan_for_new_links", AsyncMock(return_value=(["/word/new"], [])))
+    scan_for_words = AsyncMock(return_value=0)
+    monkeypatch.setattr(bot, "scan_for_words", scan_for_words)
+    monkeypatch.setattr(bot, "save_page_fingerprints", MagicMock())
+
+    await bot.run_scraper(full=full)
+    links = scan_for_words.call_args.args[0]
+    assert links == (["/word/all"] if full else ["/word/new"])
+
+@pytest.mark.asyncio
+async def test_periodic_reload(monkeypatch, tmp_path):
+    """
+    Test that lookups are refreshed after another process writes to the database
+    """
+    path = str(tmp_path / "words.db")
+    test_db = WordDatabase(path)
+    monkeypatch.setattr(bot, "database", test_db)
+    refresh = AsyncMock()
+    monkeypatch.setattr(bot, "refresh_lookups", refresh)
+
+    task = asyncio.create_task(bot.periodic_reload(0.01))
+    await asyncio.sleep(0.05)
+    refresh.assert_not_called()
+    other = WordDatabase(path)
+    other.insert_definition(('word', 'Word', 'Definition', '', 'User', '', '1', '0', ''))
+    other.close()
+    await asyncio.sleep(0.05)
+    refresh.assert_called_once()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    test_db.close()
+
 def test_get_application_handlers():
     """
     Test return correct handlers
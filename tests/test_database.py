@@ -4,7 +4,7 @@ Tests for the word_database module
 """
 import sqlite3
 import pytest
-from word_database import WordDatabase
+from word_database import WordDatabase, lookup_keys, normalize_word
 
 @pytest.fixture
 def test_db():
@@ -82,3 +82,244 @@ def test_close(test_db):
     with pytest.raises(sqlite3.ProgrammingError, match="closed database"):
         cursor = test_db.cursor
         cursor.execute("SELECT 1")
+
+def test_record_lookups(test_db):
+    """
+    Test that lookup counts are aggregated per word
+    """
+    test_db.record_lookups([('word', 2, 0, 100), ('missing', 0, 3, 100)])
+    test_db.record_lookups([('word', 1, 0, 200), ('missing', 0, 1, 50)])
+    assert test_db.get_hot_words() == [('word', 3, 200)]
+    assert test_db.get_top_misses() == [('missing', 4, 100)]
+
+def test_get_hot_words_limit(test_db):
+    """
+    Test that hot words are ordered by hits and limited
+    """
+    test_db.record_lookups([('a', 1, 0, 1), ('b', 5, 0, 1), ('c', 3, 0, 1)])
+    assert [row[0] for row in test_db.get_hot_words(2)] == ['b', 'c']
+
+def test_insert_definitions(test_db):
+    """
+    Test that batched inserts skip duplicates and invalid rows
+    """
+    inserted = test_db.insert_definitions([
+        ('word3', 'Word3', 'Definition of word3', '', 'User', 'dd.mm.yyyy', '1', '0', ''),
+        ('word', 'Word', 'Definition of word', 'Example of word usage',
+         'User', 'dd.mm.yyyy', '10', '10', 'Label2 (1), Label1 (1)'),
+        ('word4', None, 'Definition of word4', '', 'User', 'dd.mm.yyyy', '1', '0', ''),
+    ])
+    assert inserted == 1
+    assert len(test_db.get_all_definitions()) == 4
+
+def test_iter_definitions(test_db):
+    """
+    Test that iterating in chunks returns every definition in id order
+    """
+    rows = list(test_db.iter_definitions(chunk_size=2))
+    assert rows == test_db.get_all_definitions()
+    assert [row[0] for row in rows] == [1, 2, 3]
+
+def test_compress_existing(test_db):
+    """
+    Test that migrating to compressed text keeps definitions readable
+    """
+    before = test_db.get_all_definitions()
+    assert test_db.compress_existing() > 0
+    assert test_db.compress is True
+    assert test_db.get_all_definitions() == before
+    assert test_db.get_definitions('word')[1][3] == 'Definition of word2'
+    assert test_db.compress_existing() == 0
+
+def test_insert_compressed(test_db):
+    """
+    Test that new definitions are compressed and duplicates are still detected
+    """
+    test_db.compress_existing()
+    word_obj = ('long', 'Long', 'Definition of word ' * 10, 'Example of word usage ' * 5,
+                'User', 'dd.mm.yyyy', '1', '0', '')
+    assert test_db.insert_definition(word_obj) is True
+    assert test_db.insert_definitions([word_obj]) == 0
+    test_db.cursor.execute("SELECT typeof(explanation) FROM words WHERE word = 'long'")
+    assert test_db.cursor.fetchone()[0] == "blob"
+    assert test_db.get_definitions('long')[0][3] == word_obj[2]
+
+def test_compress_existing_while_open_elsewhere(tmp_path):
+    """
+    Test that a connection opened before a compress migration reads and
+    deduplicates the migrated definitions
+    """
+    path = str(tmp_path / "words.db")
+    word_obj = ('long', 'Long', 'Definition of word ' * 10, 'Example of word usage ' * 5,
+                'User', 'dd.mm.yyyy', '1', '0', '')
+    running = WordDatabase(path)
+    assert running.insert_definition(word_obj) is True
+    assert running.compress is False
+
+    migration = WordDatabase(path)
+    assert migration.compress_existing() == 1
+    migration.close()
+
+    assert running.get_definitions('long')[0][3] == word_obj[2]
+    assert running.insert_definition(word_obj) is False
+    assert running.compress is True
+    assert len(running.get_definitions('long')) == 1
+    running.close()
+
+def test_compress_existing_removes_plain_duplicates(test_db):
+    """
+    Test that a plain text copy of a compressed definition is dropped when migrated
+    """
+    word_obj = ('long', 'Long', 'Definition of word ' * 10, 'Example of word usage ' * 5,
+                'User', 'dd.mm.yyyy', '1', '0', '')
+    test_db.compress_existing()
+    test_db.insert_definition(word_obj)
+    test_db.compress = False
+    test_db.insert_definition(word_obj)
+    assert len(test_db.get_definitions('long')) == 2
+    test_db.compress_existing()
+    assert len(test_db.get_definitions('long')) == 1
+
+def test_explicit_name_wins_over_env(monkeypatch, tmp_path):
+    """
+    Test that WORD_DATABASE is only used when no database is given
+    """
+    monkeypatch.setenv("WORD_DATABASE", str(tmp_path / "env.db"))
+    db = WordDatabase(str(tmp_path / "given.db"))
+    assert db.name == str(tmp_path / "given.db")
+    db.close()
+    db = WordDatabase()
+    assert db.name == str(tmp_path / "env.db")
+    db.close()
+
+def test_data_version(tmp_path):
+    """
+    Test that the data version only changes on commits of other connections
+    """
+    path = str(tmp_path / "words.db")
+    db = WordDatabase(path)
+    other = WordDatabase(path)
+    version = db.data_version()
+    db.record_lookups([("word", 1, 0, 0)])
+    assert db.data_version() == version
+    other.insert_definition(('word', 'Word', 'Definition', '', 'User', '', '1', '0', ''))
+    assert db.data_version() != version
+    other.close()
+    db.close()
+
+def test_known_links(test_db):
+    """
+    Test that known links are filtered out of new links
+    """
+    test_db.add_known_links(['/word/a', '/word/b'])
+    test_db.add_known_links(['/word/a'])
+    assert test_db.filter_new_links(['/word/c', '/word/a', '/word/d', '/word/b']) == \
+        ['/word/c', '/word/d']
+
+def test_page_fingerprints(test_db):
+    """
+    Test that page fingerprints are stored per tab and updated
+    """
+    test_db.set_page_fingerprints([('a', 1, 'x'), ('a', 2, 'y'), ('b', 1, 'z')])
+    test_db.set_page_fingerprints([('a', 1, 'w')])
+    assert test_db.get_page_fingerprints('a') == {1: 'w', 2: 'y'}
+    assert test_db.get_page_fingerprints('c') == {}
+    test_db.delete_page_fingerprints('a', 1)
+    assert test_db.get_page_fingerprints('a') == {1: 'w'}
+    assert test_db.get_page_fingerprints('b') == {1: 'z'}
+
+@pytest.mark.parametrize(
+    "word, expected",
+    [
+        ("Word", "word"),
+        ("  hyvä   päivä ", "hyvä päivä"),
+        ("ha\u0308ma\u0308ra\u0308", "hämärä"),
+        ("C#", "c#"),
+        ("-ismi", "-ismi"),
+        ("STRASSE", "strasse"),
+        ("\u0130", "i\u0307"),
+    ]
+)
+def test_normalize_word(word, expected):
+    """
+    Test Unicode folding and whitespace collapsing of lookup keys
+    """
+    assert normalize_word(word) == expected
+
+@pytest.mark.parametrize(
+    "word, expected",
+    [
+        ("Word", ["word"]),
+        ("\"jätkä!?\"", ["\"jätkä!?\"", "jätkä"]),
+        ("c#", ["c#", "c"]),
+        ("?!", ["?!"]),
+    ]
+)
+def test_lookup_keys(word, expected):
+    """
+    Test that a key without stray punctuation is only a fallback
+    """
+    assert lookup_keys(word) == expected
+
+def test_punctuation_is_part_of_the_word(test_db):
+    """
+    Test that words differing only by punctuation keep their own definitions
+    """
+    test_db.insert_definition(('c#', 'C#', 'Definition of c#', '', 'User', '', '1', '0', ''))
+    assert [row[2] for row in test_db.get_definitions('c')] == []
+    assert [row[2] for row in test_db.get_definitions('C#')] == ['C#']
+    test_db.insert_definition(('c', 'C', 'Definition of c', '', 'User', '', '1', '0', ''))
+    assert [row[2] for row in test_db.get_definitions('c')] == ['C']
+    assert [row[2] for row in test_db.get_definitions('c#')] == ['C#']
+    # a query with stray punctuation falls back to the word without it
+    assert [row[2] for row in test_db.get_definitions('"c"?')] == ['C']
+
+def test_get_definitions_normalized(test_db):
+    """
+    Test that lookups match differently written forms of a word
+    """
+    test_db.insert_definition(('hämärä', 'Hämärä', 'Definition of hämärä', '',
+                               'User', 'dd.mm.yyyy', '1', '0', ''))
+    assert len(test_db.get_definitions('  Ha\u0308ma\u0308ra\u0308! ')) == 1
+    # rows inserted without a key are still found by their word
+    assert len(test_db.get_definitions('word')) == 2
+
+def test_word_key_migration(tmp_path):
+    """
+    Test that opening an old database adds and fills the lookup key column
+    """
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE words(
+        id INTEGER PRIMARY KEY AUTOINCREMENT, word TEXT NOT NULL, title TEXT NOT NULL,
+        explanation TEXT NOT NULL, examples TEXT, user TEXT, date TEXT, upvotes TEXT,
+        downvotes TEXT, labels TEXT, UNIQUE(word, title, explanation))""")
+    conn.execute("""INSERT INTO words (word, title, explanation)
+        VALUES ('ha\u0308ma\u0308ra\u0308', 'Hämärä', 'Definition')""")
+    conn.commit()
+    conn.close()
+
+    db = WordDatabase(path)
+    db.cursor.execute("SELECT word_key FROM words")
+    assert db.cursor.fetchone()[0] == "hämärä"
+    assert len(db.get_definitions("HÄMÄRÄ")) == 1
+    assert len(db.get_definitions("hämärä")[0]) == 10
+    db.close()
+
+def test_stripped_word_keys_are_recomputed(tmp_path):
+    """
+    Test that keys stored with punctuation stripped are recomputed once
+    """
+    path = str(tmp_path / "old.db")
+    db = WordDatabase(path)
+    db.insert_definition(('c#', 'C#', 'Definition of c#', '', 'User', '', '1', '0', ''))
+    db.cursor.execute("UPDATE words SET word_key = 'c'")
+    db.cursor.execute("PRAGMA user_version = 0")
+    db.conn.commit()
+    db.close()
+
+    db = WordDatabase(path)
+    db.cursor.execute("SELECT word_key FROM words")
+    assert db.cursor.fetchone()[0] == "c#"
+    assert db.get_definitions("c") == []
+    db.close()
@@ -0,0 +1,109 @@
+# pylint: disable=redefined-outer-name
+"""
+Tests for the dictionary_io module
+"""
+import gzip
+import json
+import pytest
+from word_database import WordDatabase
+from dictionary_io import (
+    dump_identity, export_dictionary, import_dictionary, write_progress, main
+)
+
+@pytest.fixture
+def test_db():
+    """
+    Create test version of WordDatabase with a few definitions
+    """
+    db = WordDatabase(":memory:")
+    db.insert_definitions([
+        (f'word{i}', f'Wörd{i}', f'Definition of word{i}', '', 'User', 'dd.mm.yyyy', '1', '0', '')
+        for i in range(5)
+    ])
+    yield db
+    db.close()
+
+@pytest.fixture
+def empty_db():
+    """
+    Create empty test version of WordDatabase
+    """
+    db = WordDatabase(":memory:")
+    yield db
+    db.close()
+
+@pytest.mark.parametrize("name", ["dump.jsonl", "dump.jsonl.gz"])
+def test_export_import_roundtrip(test_db, empty_db, tmp_path, name):
+    """
+    Test that an exported dump imports into an identical dictionary
+    """
+    path = str(tmp_path / name)
+    assert export_dictionary(test_db, path, chunk_size=2) == 5
+    assert import_dictionary(empty_db, path, batch_size=2) == 5
+    assert empty_db.get_all_definitions() == test_db.get_all_definitions()
+    assert not (tmp_path / (name + ".progress")).exists()
+
+def test_export_is_compressed(test_db, tmp_path):
+    """
+    Test that .gz dumps are gzip compressed line-delimited JSON
+    """
+    path = tmp_path / "dump.jsonl.gz"
+    export_dictionary(test_db, str(path))
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[0])["columns"][0] == "word"
+    assert json.loads(lines[1])[1] == "Wörd0"
+
+def test_import_resumes(test_db, empty_db, tmp_path):
+    """
+    Test that an import continues after the recorded progress
+    """
+    path = str(tmp_path / "dump.jsonl")
+    export_dictionary(test_db, path)
+    write_progress(path + ".progress", dump_identity(path), 3)
+    assert import_dictionary(empty_db, path) == 2
+    assert [row[1] for row in empty_db.get_all_definitions()] == ["word3", "word4"]
+
+@pytest.mark.parametrize("progress", ['{"dump": "0:0", "lines": 3}', "3"])
+def test_import_ignores_progress_of_other_dump(test_db, empty_db, tmp_path, caplog, progress):
+    """
+    Test that progress recorded for another dump, or in the old format, is ignored
+    """
+    path = str(tmp_path / "dump.jsonl")
+    export_dictionary(test_db, path)
+    (tmp_path / "dump.jsonl.progress").write_text(progress, encoding="utf-8")
+    assert import_dictionary(empty_db, path) == 5
+    assert "another dump" in caplog.text
+
+def test_import_is_idempotent(test_db, tmp_path):
+    """
+    Test that importing definitions that already exist inserts nothing
+    """
+    path = str(tmp_path / "dump.jsonl")
+    export_dictionary(test_db, path)
+    assert import_dictionary(test_db, path) == 0
+
+def test_import_rejects_unknown_format(empty_db, tmp_path):
+    """
+    Test that files that are not dictionary dumps are rejected
+    """
+    path = tmp_path / "dump.jsonl"
+    path.write_text('{"format": "other"}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        import_dictionary(empty_db, str(path))
+
+def test_main_uses_given_database(monkeypatch, tmp_path):
+    """
+    Test that --db wins over WORD_DATABASE
+    """
+    monkeypatch.setenv("WORD_DATABASE", str(tmp_path / "env.db"))
+    given = str(tmp_path / "given.db")
+    dump = str(tmp_path / "dump.jsonl")
+    db = WordDatabase(given)
+    db.insert_definition(('word', 'Word', 'Definition', '', 'User', '', '1', '0', ''))
+    db.close()
+    monkeypatch.setattr("sys.argv", ["dictionary_io.py", "export", dump, "--db", given])
+    main()
+    with open(dump, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert not (tmp_path / "env.db").exists()
@@ -0,0 +1,95 @@
+"""
+Tests for the log_config module
+"""
+import json
+import logging
+from logging.handlers import QueueHandler
+import pytest
+from log_config import JsonFormatter, RateLimitFilter, setup_logging
+
+def make_record(msg: str, *args) -> logging.LogRecord:
+    """
+    Create an error log record
+    """
+    return logging.LogRecord("scraper", logging.ERROR, __file__, 1, msg, args, None)
+
+def test_rate_limit_filter_suppresses_repeats():
+    """
+    Test that repeated records are dropped after the burst and counted
+    """
+    rate_filter = RateLimitFilter(burst=2, interval=60)
+    allowed = [rate_filter.filter(make_record("Failed to fetch %s", i)) for i in range(5)]
+    assert allowed == [True, True, False, False, False]
+    assert rate_filter.filter(make_record("Other message"))
+
+def test_rate_limit_filter_reports_suppressed(monkeypatch):
+    """
+    Test that the first record of a new window mentions suppressed records
+    """
+    now = [0.0]
+    monkeypatch.setattr("log_config.time.monotonic", lambda: now[0])
+    rate_filter = RateLimitFilter(burst=1, interval=10)
+    rate_filter.filter(make_record("Failed to fetch %s", 1))
+    rate_filter.filter(make_record("Failed to fetch %s", 2))
+    now[0] = 11.0
+    record = make_record("Failed to fetch %s", 3)
+    assert rate_filter.filter(record)
+    assert record.getMessage() == "Failed to fetch 3 (1 similar messages suppressed)"
+
+def test_json_formatter():
+    """
+    Test that records are formatted as JSON objects
+    """
+    entry = json.loads(JsonFormatter().format(make_record("Failed to fetch %s", "ä")))
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "scraper"
+    assert entry["message"] == "Failed to fetch ä"
+
+@pytest.fixture
+def restore_root_logger():
+    """
+    Restore root logger handlers and level after a test
+    """
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+@pytest.mark.usefixtures("restore_root_logger")
+def test_setup_logging_writes_through_queue(tmp_path):
+    """
+    Test that records go through the queue and end up in the log file
+    """
+    path = tmp_path / "bot.log"
+    listener = setup_logging(str(path), json_output=True)
+    assert isinstance(logging.getLogger().handlers[0], QueueHandler)
+    logging.getLogger("test").info("hello %s", "world")
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    assert json.loads(path.read_text(encoding="utf-8"))["message"] == "hello world"
+
+@pytest.mark.usefixtures("restore_root_logger")
+def test_setup_logging_keeps_exceptions_apart(tmp_path):
+    """
+    Test that tracebacks are written to their own JSON field and still in plain text logs
+    """
+    for json_output in (True, False):
+        path = tmp_path / f"bot_{json_output}.log"
+        listener = setup_logging(str(path), json_output=json_output)
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            logging.getLogger("test").exception("failed %s", "lookup")
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        output = path.read_text(encoding="utf-8")
+        if json_output:
+            entry = json.loads(output)
+            assert entry["message"] == "failed lookup"
+            assert "ValueError: broken" in entry["exception"]
+        else:
+            assert "failed lookup" in output
+            assert "ValueError: broken" in output
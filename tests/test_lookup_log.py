@@ -0,0 +1,95 @@
+# pylint: disable=redefined-outer-name
+"""
+Tests for the lookup_log module
+"""
+import asyncio
+import pytest
+from word_database import WordDatabase
+from lookup_log import LookupLog
+
+@pytest.fixture
+def test_db():
+    """
+    Create test version of WordDatabase
+    """
+    db = WordDatabase(":memory:")
+    yield db
+    db.close()
+
+def test_record_does_not_write(test_db):
+    """
+    Test that recording a lookup only queues the event
+    """
+    log = LookupLog(test_db)
+    log.record("Word ", True)
+    assert log.queue.qsize() == 1
+    assert not test_db.get_hot_words()
+
+@pytest.mark.asyncio
+async def test_flush_aggregates(test_db):
+    """
+    Test that flushing writes aggregated hits and misses
+    """
+    log = LookupLog(test_db, max_batch=2)
+    log.record("word", True)
+    log.record("WORD", True)
+    log.record("word", False)
+    log.record("missing", False)
+    assert await log.flush() == 3
+    assert test_db.get_hot_words()[0][:2] == ("word", 2)
+    assert [row[:2] for row in test_db.get_top_misses()] == [("word", 1), ("missing", 1)]
+    assert log.queue.empty()
+
+@pytest.mark.asyncio
+async def test_record_drops_when_full(test_db):
+    """
+    Test that events are dropped instead of blocking when the queue is full
+    """
+    log = LookupLog(test_db, max_queue=1)
+    log.record("word", True)
+    log.record("word", True)
+    assert log.dropped == 1
+    await log.flush()
+    assert log.dropped == 0
+
+@pytest.mark.asyncio
+async def test_run_flushes_periodically(test_db):
+    """
+    Test that the background task flushes queued events
+    """
+    log = LookupLog(test_db, flush_interval=0.01)
+    task = asyncio.create_task(log.run())
+    log.record("word", True)
+    await asyncio.sleep(0.05)
+    assert test_db.get_hot_words()[0][:2] == ("word", 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+@pytest.mark.asyncio
+async def test_flush_does_not_block_loop(test_db):
+    """
+    Test that writing events waits for the database in a worker thread
+    """
+    log = LookupLog(test_db)
+    log.record("word", True)
+    test_db.lock.acquire() # pylint: disable=consider-using-with
+    flush = asyncio.create_task(log.flush())
+    await asyncio.sleep(0.01)
+    # the loop keeps running while the database is busy
+    assert not flush.done()
+    test_db.lock.release()
+    assert await flush == 1
+
+@pytest.mark.asyncio
+async def test_run_flushes_when_cancelled(test_db):
+    """
+    Test that cancelling the background task writes the remaining events
+    """
+    log = LookupLog(test_db, flush_interval=60)
+    task = asyncio.create_task(log.run())
+    await asyncio.sleep(0)
+    log.record("word", True)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert test_db.get_hot_words()[0][:2] == ("word", 1)
@@ -0,0 +1,88 @@
+# pylint: disable=redefined-outer-name
+"""
+Tests for the memory_engine module
+"""
+import pytest
+from word_database import WordDatabase
+from memory_engine import HEADER, MemoryDictionary, build_buffer
+
+@pytest.fixture
+def test_db():
+    """
+    Create test version of WordDatabase with interleaved words
+    """
+    db = WordDatabase(":memory:")
+    db.insert_definitions([
+        ('word', 'Word', 'Definition of word', 'Example of word usage',
+         'User', 'dd.mm.yyyy', '10', '10', 'Label2 (1), Label1 (1)'),
+        ('äö', 'Äö', 'Määritelmä', None, 'Käyttäjä', 'dd.mm.yyyy', '1', '0', ''),
+        ('word', 'Word2', 'Definition of word2', '',
+         'User2', 'dd.mm.yyyy', '10', '10', ''),
+        ('test', 'test', 'Definition of test', 'Example of test usage',
+         'User2', 'dd.mm.yyyy', '10', '10', 'Label2 (1), Label1 (1)'),
+    ])
+    yield db
+    db.close()
+
+@pytest.mark.parametrize("word", ["word", "WORD", "äö", "a\u0308o\u0308", " test. ", "missing"])
+def test_same_results_as_database(test_db, word):
+    """
+    Test that the engine returns exactly what the database returns
+    """
+    engine = MemoryDictionary.from_database(test_db)
+    assert engine.get_definitions(word) == test_db.get_definitions(word)
+
+def test_punctuation_is_part_of_the_word(test_db):
+    """
+    Test that words differing only by punctuation are not merged
+    """
+    test_db.insert_definitions([
+        ('c#', 'C#', 'Definition of c#', '', 'User', '', '1', '0', ''),
+        ('c', 'C', 'Definition of c', '', 'User', '', '1', '0', ''),
+    ])
+    engine = MemoryDictionary.from_database(test_db)
+    assert [row[2] for row in engine.get_definitions("C#")] == ["C#"]
+    assert [row[2] for row in engine.get_definitions("c")] == ["C"]
+    assert [row[2] for row in engine.get_definitions("(c)")] == ["C"]
+
+def test_rows_ordered_by_id(test_db):
+    """
+    Test that definitions of a word keep their database order
+    """
+    engine = MemoryDictionary.from_database(test_db)
+    assert [row[2] for row in engine.get_definitions("word")] == ["Word", "Word2"]
+    assert engine.rows == 4
+
+def test_save_and_open(test_db, tmp_path):
+    """
+    Test that an engine file can be mapped and used
+    """
+    path = str(tmp_path / "words.idx")
+    MemoryDictionary.save(test_db, path)
+    engine = MemoryDictionary.open(path)
+    assert engine.get_definitions("äö") == test_db.get_definitions("äö")
+    engine.close()
+
+def test_arrays_aligned():
+    """
+    Test that the id and offset arrays start 8 byte aligned
+    """
+    assert HEADER.size % 8 == 0
+
+def test_empty_database():
+    """
+    Test that an engine can be built from an empty database
+    """
+    db = WordDatabase(":memory:")
+    engine = MemoryDictionary.from_database(db)
+    assert engine.get_definitions("word") == []
+    db.close()
+
+def test_invalid_buffer(test_db):
+    """
+    Test that buffers in another format are rejected
+    """
+    buffer = bytearray(build_buffer(test_db))
+    buffer[:4] = b"XXXX"
+    with pytest.raises(ValueError):
+        MemoryDictionary(bytes(buffer))
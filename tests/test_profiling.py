@@ -0,0 +1,91 @@
+"""
+Tests for the profiling module
+"""
+import asyncio
+import os
+import time
+import pytest
+from telegram.ext import CommandHandler
+from profiling import HandlerTimings, Profiler, instrument_handlers
+
+def test_handler_timings_report():
+    """
+    Test that the report lists the slowest recent calls first
+    """
+    timings = HandlerTimings(window=3)
+    for duration in (0.5, 0.001, 0.002, 0.003):
+        timings.record("word_handler", duration, f"call {duration}")
+    report = timings.report(slowest=2)
+    lines = report.splitlines()
+    # the 0.5 s call is no longer among the 3 most recent
+    assert lines[0].startswith("word_handler: 3 recent calls")
+    assert "call 0.003" in lines[1]
+    assert "call 0.002" in lines[2]
+
+@pytest.mark.asyncio
+async def test_instrument_handlers():
+    """
+    Test that wrapped handler callbacks are timed and still called
+    """
+    callback_calls = []
+    async def start(update, context):
+        callback_calls.append((update, context))
+    timings = HandlerTimings()
+    handler = CommandHandler("start", start)
+    instrument_handlers([handler], timings)
+    await handler.callback("update", "context")
+    assert callback_calls == [("update", "context")]
+    assert len(timings.calls["start"]) == 1
+
+@pytest.mark.asyncio
+async def test_capture_writes_report(tmp_path):
+    """
+    Test that a capture records slow callbacks and writes a report file
+    """
+    profiler = Profiler(str(tmp_path), slow_callback=0.01)
+    profiler.timings.record("inline_query", 0.2, "inline query 'sana'")
+
+    async def blocking_work():
+        await asyncio.sleep(0.01)
+        time.sleep(0.05)
+
+    work = asyncio.create_task(blocking_work())
+    path = await profiler.capture(0.1)
+    await work
+    with open(path, encoding="utf-8") as f:
+        report = f.read()
+    assert "Executing" in report
+    assert "inline query 'sana'" in report
+    assert "blocking_work" in report
+    assert not asyncio.get_running_loop().get_debug()
+    assert profiler.running is False
+
+@pytest.mark.asyncio
+async def test_capture_runs_once(tmp_path):
+    """
+    Test that only one capture runs at a time
+    """
+    profiler = Profiler(str(tmp_path))
+    first = asyncio.create_task(profiler.capture(0.05))
+    await asyncio.sleep(0)
+    assert await profiler.capture(0.05) is None
+    assert await first is not None
+
+@pytest.mark.asyncio
+async def test_start_capture_keeps_task(tmp_path):
+    """
+    Test that a background capture is kept referenced until it finishes
+    """
+    profiler = Profiler(str(tmp_path))
+    profiler.start_capture(0.01)
+    task = profiler._task # pylint: disable=W0212
+    assert task is not None
+    assert os.path.exists(await task)
+
+def test_command_handler_restricted_to_admins():
+    """
+    Test that the /profile command only accepts admin users
+    """
+    handler = Profiler().command_handler([42])
+    assert handler.commands == frozenset({"profile"})
+    assert handler.filters.user_ids == frozenset({42})
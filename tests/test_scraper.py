@@ -0,0 +1,236 @@
+# pylint: disable=redefined-outer-name
+"""
+Tests for the scraper module
+"""
+import pytest
+from word_database import WordDatabase
+from scraper_constants import BROWSE_TABS
+import scraper
+from scraper import (
+    parse_definitions,
+    parse_votes,
+    scan_for_words,
+    scan_for_new_links,
+    save_page_fingerprints,
+    scrape_worker,
+    shard_tabs
+)
+
+def word_page(title: str, boxes: list) -> str:
+    """
+    Create a word page with one box per (explanation, upvotes, downvotes)
+    """
+    html = ""
+    for i, (explanation, upvotes, downvotes) in enumerate(boxes):
+        html += f"""
+        <div class="box">
+          {f"<h1>{title}</h1>" if i == 0 else ""}
+          <p>{explanation}</p>
+          <blockquote>Example {i}</blockquote>
+          <span class="user">User{i}</span><span class="datetime">1.1.2020</span>
+          <span class="label label-positive">Label</span>
+          <button class="btn btn-vote-up rate-up">{upvotes}</button>
+          <button class="btn btn-vote-down rate-down">{downvotes}</button>
+        </div>"""
+    return f"<html><body>{html}</body></html>"
+
+@pytest.fixture
+def test_db():
+    """
+    Create test version of WordDatabase
+    """
+    db = WordDatabase(":memory:")
+    yield db
+    db.close()
+
+@pytest.mark.parametrize("votes, expected", [("12", 12), ("2,7k", 2700), (" 1K ", 1000)])
+def test_parse_votes(votes, expected):
+    """
+    Test vote count parsing
+    """
+    assert parse_votes(votes) == expected
+
+def test_parse_definitions():
+    """
+    Test that definitions are parsed and downvoted ones skipped
+    """
+    html = word_page("Sana", [("Selitys", "10", "1"), ("Huono", "1", "2,1k")])
+    assert parse_definitions(html) == [
+        ("sana", "Sana", "Selitys", "Example 0", "User0", "1.1.2020", "10", "1", "Label")
+    ]
+    assert not parse_definitions("<html></html>")
+
+def test_shard_tabs_cover_all_tabs():
+    """
+    Test that shards split the tabs without overlap
+    """
+    shards = [shard_tabs(BROWSE_TABS, 4, i) for i in range(4)]
+    assert sorted(tab for shard in shards for tab in shard) == sorted(BROWSE_TABS)
+    assert max(len(s) for s in shards) - min(len(s) for s in shards) <= 1
+
+@pytest.mark.asyncio
+async def test_scan_for_words_batches(monkeypatch, test_db):
+    """
+    Test that scanned definitions are written in batches
+    """
+    pages = {
+        f"{scraper.ROOT_URL}/word/{i}": word_page(f"Sana{i}", [("Selitys", "1", "0")])
+        for i in range(5)
+    }
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        return pages.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+    writes = []
+    insert_definitions = test_db.insert_definitions
+    def counting_insert(word_objs):
+        writes.append(len(word_objs))
+        return insert_definitions(word_objs)
+    monkeypatch.setattr(test_db, "insert_definitions", counting_insert)
+
+    links = [f"/word/{i}" for i in range(5)] + ["/word/missing"]
+    assert await scan_for_words(links, test_db, concurrency=3, batch_size=2) == 5
+    assert writes == [2, 2, 1]
+    assert len(test_db.get_all_definitions()) == 5
+    assert test_db.filter_new_links(links) == ["/word/missing"]
+
+def browse_site(tab_pages: dict) -> dict:
+    """
+    Create browse pages for tabs, tab_pages maps a tab to a list of link lists per page
+    """
+    site = {}
+    for tab, pages in tab_pages.items():
+        pagination = "".join(f'<a href="?page={i}">{i}</a>' for i in range(1, len(pages) + 1))
+        site[scraper.BROWSE_ROOT_URL + tab] = f"<html>{pagination}</html>"
+        for i, links in enumerate(pages, start=1):
+            anchors = "".join(f'<a href="{link}">x</a>' for link in links)
+            site[scraper.BROWSE_ROOT_URL + tab + f"/?page={i}"] = f"<html>{anchors}</html>"
+    return site
+
+def listing(words: list, per_page: int = 3) -> list:
+    """
+    Split an ordered word link listing into browse pages
+    """
+    return [words[i:i + per_page] for i in range(0, len(words), per_page)]
+
+@pytest.mark.asyncio
+async def test_scan_for_new_links_incremental(monkeypatch, test_db):
+    """
+    Test that only new links are returned and an unchanged tab is not walked
+    """
+    pages = listing([f"/word/{i:02}" for i in range(21)])
+    site = browse_site({"a": pages})
+    fetched = []
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        fetched.append(url)
+        return site.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=2)
+    assert links == [link for page in pages for link in page]
+    test_db.add_known_links(links)
+    save_page_fingerprints(test_db, changed)
+    assert len(test_db.get_page_fingerprints("a")) == 7
+
+    fetched.clear()
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=2)
+    assert not links
+    assert not changed
+    # root, first and last page
+    assert len(fetched) == 3
+
+@pytest.mark.asyncio
+async def test_scan_for_new_links_after_unchanged_pages(monkeypatch, test_db):
+    """
+    Test that a new link is found after more than stop_after unchanged pages
+    """
+    words = [f"/word/{i:02}" for i in range(36)]
+    site = browse_site({"a": listing(words)})
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        return site.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=5)
+    test_db.add_known_links(links)
+    save_page_fingerprints(test_db, changed)
+
+    # lands on page 10 and shifts the later links onto a new page 13
+    words.insert(28, "/word/27b")
+    site.update(browse_site({"a": listing(words)}))
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=5)
+    assert links == ["/word/27b"]
+    assert [page for _, page, _, _ in changed] == [10, 11, 12, 13]
+
+@pytest.mark.asyncio
+async def test_scan_for_new_links_same_page_count(monkeypatch, test_db):
+    """
+    Test that a tab is walked when its page count stays but its last page changes
+    """
+    words = [f"/word/{i:02}" for i in range(20)]
+    site = browse_site({"a": listing(words)})
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        return site.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+
+    links, changed = await scan_for_new_links(test_db, ["a"])
+    test_db.add_known_links(links)
+    save_page_fingerprints(test_db, changed)
+
+    words.insert(7, "/word/06b")
+    site.update(browse_site({"a": listing(words)}))
+    links, changed = await scan_for_new_links(test_db, ["a"])
+    assert links == ["/word/06b"]
+    assert [page for _, page, _, _ in changed] == [3, 4, 5, 6, 7]
+
+@pytest.mark.asyncio
+async def test_scan_for_new_links_stops_on_shifted_pages(monkeypatch, test_db):
+    """
+    Test that a tab is left after stop_after changed pages with only known links
+    """
+    words = [f"/word/{i:02}" for i in range(21)]
+    site = browse_site({"a": [words[i:i + 3] for i in range(0, 21, 3)]})
+    fetched = []
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        fetched.append(url)
+        return site.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=2)
+    test_db.add_known_links(links)
+    save_page_fingerprints(test_db, changed)
+
+    # a new word on page 2 of an alphabetical listing shifts every later page
+    words.insert(4, "/word/03b")
+    site.update(browse_site({"a": [words[i:i + 3] for i in range(0, 21, 3)]}))
+    fetched.clear()
+    links, changed = await scan_for_new_links(test_db, ["a"], stop_after=2)
+    assert links == ["/word/03b"]
+    assert [page for _, page, _, _ in changed] == [2, 3, 4]
+    # root, first and last page, then pages 2-4
+    assert len(fetched) == 6
+
+def test_scrape_worker_uses_given_database(monkeypatch, tmp_path):
+    """
+    Test that the database given to a worker wins over WORD_DATABASE
+    """
+    monkeypatch.setenv("WORD_DATABASE", str(tmp_path / "env.db"))
+    site = browse_site({"a": [["/word/sana"]]})
+    site[scraper.ROOT_URL + "/word/sana"] = word_page("Sana", [("Selitys", "1", "0")])
+    async def fake_fetch(session, url): # pylint: disable=W0613
+        return site.get(url)
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+
+    given = str(tmp_path / "given.db")
+    assert scrape_worker(["a"], given, 1, 10) == 1
+    db = WordDatabase(given)
+    assert len(db.get_definitions("sana")) == 1
+    db.close()
+    assert not (tmp_path / "env.db").exists()
+
+def test_failed_links_keep_page_changed(test_db):
+    """
+    Test that pages with links that were not scraped keep their old fingerprint
+    """
+    changed = [("a", 1, "f1", ["/word/x"]), ("a", 2, "f2", ["/word/y"])]
+    test_db.add_known_links(["/word/x"])
+    save_page_fingerprints(test_db, changed)
+    assert test_db.get_page_fingerprints("a") == {1: "f1"}
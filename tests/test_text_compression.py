@@ -0,0 +1,50 @@
+"""
+Tests for the text_compression module
+"""
+from text_compression import TextCompressor, CompressedRow, train_dictionary
+
+TEXTS = [f"Sana numero {i} tarkoittaa jotain tosi hauskaa ja kaverit käyttää sitä usein."
+         for i in range(50)]
+
+def test_train_dictionary_prefers_common_strings():
+    """
+    Test that the dictionary holds common strings and respects the size limit
+    """
+    zdict = train_dictionary(TEXTS, size=64)
+    assert len(zdict) <= 64
+    assert "tarkoittaa".encode("utf-8") in zdict
+
+def test_compress_roundtrip_with_dictionary():
+    """
+    Test that compressed text decompresses to the original and benefits from the dictionary
+    """
+    plain = TextCompressor()
+    trained = TextCompressor({1: train_dictionary(TEXTS)}, 1)
+    text = TEXTS[7]
+    assert trained.decompress(trained.compress(text)) == text
+    assert len(trained.compress(text)) < len(plain.compress(text))
+
+def test_compress_keeps_short_and_empty_text():
+    """
+    Test that values that would not get smaller are stored as they are
+    """
+    compressor = TextCompressor()
+    assert compressor.compress("ok") == "ok"
+    assert compressor.compress("") == ""
+    assert compressor.compress(None) is None
+    assert compressor.decompress("ok") == "ok"
+
+def test_compressed_row_decompresses_on_access():
+    """
+    Test that wrapped rows behave like the original tuples
+    """
+    compressor = TextCompressor({1: train_dictionary(TEXTS)}, 1)
+    row = (1, "sana", "Sana", TEXTS[0], TEXTS[1], "User", "1.1.2020", "1", "0", "")
+    stored = (*row[:3], compressor.compress(row[3]), compressor.compress(row[4]), *row[5:])
+    wrapped = compressor.wrap_rows([stored, row])
+    assert isinstance(wrapped[0], CompressedRow)
+    assert wrapped[1] is row
+    assert wrapped[0] == row
+    assert wrapped[0][3] == TEXTS[0]
+    assert wrapped[0][1:5] == row[1:5]
+    assert tuple(wrapped[0]) == row
@@ -0,0 +1,146 @@
+"""
+Tests for the update_processor module
+"""
+import asyncio
+from datetime import datetime
+import pytest
+from telegram import Update, Message, Chat, User, CallbackQuery, InlineQuery
+from update_processor import ChatOrderedUpdateProcessor, ordering_key
+
+USER = User(id=1, first_name="Test", is_bot=False)
+
+def message_update(update_id: int, chat_id: int) -> Update:
+    """
+    Create a text message update for chat_id
+    """
+    chat = Chat(id=chat_id, type="private")
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, text="word")
+    return Update(update_id=update_id, message=message)
+
+def test_ordering_key():
+    """
+    Test ordering keys for the different update types
+    """
+    assert ordering_key(message_update(1, 10)) == ("chat", 10)
+    inline_callback = CallbackQuery(id="1", from_user=USER, chat_instance="c",
+                                    inline_message_id="abc", data="def:word:1")
+    assert ordering_key(Update(update_id=2, callback_query=inline_callback)) == \
+        ("inline_message", "abc")
+    query = InlineQuery(id="1", from_user=USER, query="word", offset="")
+    assert ordering_key(Update(update_id=3, inline_query=query)) is None
+    assert ordering_key(object()) is None
+
+@pytest.mark.asyncio
+async def test_same_chat_processed_in_order():
+    """
+    Test that updates of the same chat do not overlap and keep their order
+    """
+    processor = ChatOrderedUpdateProcessor(8)
+    events = []
+
+    async def handle(name: str, delay: float):
+        events.append(("start", name))
+        await asyncio.sleep(delay)
+        events.append(("end", name))
+
+    await asyncio.gather(
+        processor.process_update(message_update(1, 10), handle("first", 0.02)),
+        processor.process_update(message_update(2, 10), handle("second", 0)),
+    )
+    assert events == [("start", "first"), ("end", "first"),
+                      ("start", "second"), ("end", "second")]
+    assert not processor._queues # pylint: disable=protected-access
+
+@pytest.mark.asyncio
+async def test_different_chats_processed_concurrently():
+    """
+    Test that a slow update does not hold up updates of other chats
+    """
+    processor = ChatOrderedUpdateProcessor(8)
+    events = []
+
+    async def handle(name: str, delay: float):
+        await asyncio.sleep(delay)
+        events.append(name)
+
+    await asyncio.gather(
+        processor.process_update(message_update(1, 10), handle("slow", 0.02)),
+        processor.process_update(message_update(2, 20), handle("fast", 0)),
+    )
+    assert events == ["fast", "slow"]
+
+@pytest.mark.asyncio
+async def test_global_limit():
+    """
+    Test that the number of concurrently processed updates is limited
+    """
+    processor = ChatOrderedUpdateProcessor(2)
+    running = 0
+    peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(
+        processor.process_update(message_update(i, i), handle()) for i in range(6)
+    ))
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_waiting_updates_do_not_hold_slots():
+    """
+    Test that updates queued behind an update of the same chat do not use up the
+    global limit and hold up other chats
+    """
+    processor = ChatOrderedUpdateProcessor(2)
+    assert processor.max_concurrent_updates == 2
+    events = []
+
+    async def handle(name: str, delay: float):
+        await asyncio.sleep(delay)
+        events.append(name)
+
+    await asyncio.gather(
+        processor.process_update(message_update(1, 10), handle("slow", 0.05)),
+        processor.process_update(message_update(2, 10), handle("queued", 0)),
+        processor.process_update(message_update(3, 10), handle("queued", 0)),
+        processor.process_update(message_update(4, 20), handle("other chat", 0)),
+    )
+    assert events == ["other chat", "slow", "queued", "queued"]
+
+@pytest.mark.asyncio
+async def test_cancelled_waiting_update_is_skipped():
+    """
+    Test that cancelling a queued update lets the next one run
+    """
+    processor = ChatOrderedUpdateProcessor(4)
+    events = []
+
+    async def handle(name: str, delay: float):
+        await asyncio.sleep(delay)
+        events.append(name)
+
+    first = asyncio.create_task(processor.process_update(message_update(1, 10),
+                                                         handle("first", 0.02)))
+    second_handler = handle("second", 0)
+    second = asyncio.create_task(processor.process_update(message_update(2, 10),
+                                                          second_handler))
+    third = asyncio.create_task(processor.process_update(message_update(3, 10),
+                                                         handle("third", 0)))
+    await asyncio.sleep(0)
+    second.cancel()
+    second_handler.close()
+    await asyncio.gather(first, third, return_exceptions=True)
+    assert events == ["first", "third"]
+    assert not processor._queues # pylint: disable=protected-access
+
+def test_invalid_limit():
+    """
+    Test that the limit must be positive
+    """
+    with pytest.raises(ValueError):
+        ChatOrderedUpdateProcessor(0)
@@ -0,0 +1,95 @@
+# pylint: disable=redefined-outer-name
+"""
+Tests for the word_cache module
+"""
+import pytest
+from word_database import WordDatabase
+from word_cache import WordCache, load_snapshot, save_snapshot
+
+@pytest.fixture
+def test_db():
+    """
+    Create test version of WordDatabase
+    """
+    db = WordDatabase(":memory:")
+    for word in ("word", "test", "other"):
+        db.insert_definition((word, word.title(), f"Definition of {word}", '',
+                              'User', 'dd.mm.yyyy', '10', '10', ''))
+    yield db
+    db.close()
+
+def test_cache_evicts_least_recently_used():
+    """
+    Test that the cache stays within its size and evicts the oldest entry
+    """
+    cache = WordCache(max_words=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+    assert cache.get("b") is None
+    assert cache.words() == ["c", "a"]
+
+def test_get_reply_renders_once():
+    """
+    Test that rendered replies of cached definitions are reused
+    """
+    cache = WordCache()
+    definitions = [("row",)]
+    cache.put("word", definitions)
+    calls = []
+    def render(row):
+        calls.append(row)
+        return "reply"
+    assert cache.get_reply("word", definitions, 0, render) == "reply"
+    assert cache.get_reply("word", definitions, 0, render) == "reply"
+    assert calls == [("row",)]
+
+def test_warm_loads_words(test_db):
+    """
+    Test that warming loads definitions and replies for found words only
+    """
+    cache = WordCache()
+    loaded = cache.warm(test_db, ["test", "missing", "word"], lambda row: row[2])
+    assert loaded == 2
+    assert cache.words() == ["test", "word"]
+    assert cache.entries["test"][1] == {0: "Test"}
+
+def test_warm_respects_limits(test_db):
+    """
+    Test that warming is bounded by cache size and time budget
+    """
+    cache = WordCache(max_words=1)
+    assert cache.warm(test_db, ["word", "test"]) == 1
+    cache = WordCache()
+    assert cache.warm(test_db, ["word", "test"], time_budget=-1) == 0
+
+def test_replace(test_db):
+    """
+    Test that a cache takes over the entries of a freshly warmed one
+    """
+    cache = WordCache()
+    cache.put("stale", [1])
+    refreshed = WordCache()
+    refreshed.warm(test_db, ["word"])
+    cache.replace(refreshed)
+    assert cache.words() == ["word"]
+    assert cache.get("word") == test_db.get_definitions("word")
+
+def test_snapshot_roundtrip(tmp_path):
+    """
+    Test that snapshots can be written and read back
+    """
+    path = str(tmp_path / "hot.json")
+    save_snapshot(path, ["ä", "b", "c"])
+    assert load_snapshot(path) == ["ä", "b", "c"]
+    assert load_snapshot(path, 2) == ["ä", "b"]
+
+def test_load_snapshot_unusable(tmp_path):
+    """
+    Test that a missing or corrupt snapshot yields an empty hot set
+    """
+    assert load_snapshot(str(tmp_path / "missing.json")) == []
+    path = tmp_path / "broken.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert load_snapshot(str(path)) == []
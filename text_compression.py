@@ -0,0 +1,145 @@
+"""
+Dictionary based compression of definition text columns
+
+Compressed values are stored as BLOBs: one byte identifying the preset dictionary
+followed by a raw deflate stream. Uncompressed values stay TEXT, so both can
+live in the same table while a database is being migrated.
+"""
+import re
+import zlib
+from collections import Counter
+from collections.abc import Sequence
+
+# zlib can only use the last 32 KiB of a preset dictionary
+MAX_DICTIONARY_SIZE = 32 * 1024
+# columns of a definition row that may be compressed (explanation, examples)
+COMPRESSED_COLUMNS = (3, 4)
+NO_DICTIONARY = 0
+
+def train_dictionary(texts, size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    Build a preset dictionary from the most common words and word pairs in texts
+
+    The most useful strings are placed at the end, closest to the data being compressed.
+
+    returns: dictionary bytes, at most size bytes long
+    """
+    counts = Counter()
+    for text in texts:
+        tokens = re.findall(r"\w+|[^\w\s]", text)
+        counts.update(token + " " for token in tokens if len(token) > 2)
+        counts.update(f"{a} {b} " for a, b in zip(tokens, tokens[1:]))
+    chosen = []
+    used = 0
+    # a string saves roughly its length every time it occurs
+    for token, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]),
+                               reverse=True):
+        if count < 2:
+            break
+        encoded = token.encode("utf-8")
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+class TextCompressor:
+    """
+    Compresses and decompresses text using the preset dictionaries of a database
+
+    loader is called to read the dictionaries again when a value compressed with
+    an unknown dictionary is met, eg. one trained by another process.
+    """
+    def __init__(self, dictionaries: dict = None, current: int = NO_DICTIONARY, level: int = 9,
+                 loader=None):
+        self.dictionaries = {NO_DICTIONARY: b""}
+        self.dictionaries.update(dictionaries or {})
+        self.current = current
+        self.level = level
+        self.loader = loader
+
+    def compress(self, text):
+        """
+        Compress text with the current dictionary
+
+        returns: compressed bytes, or text unchanged if compression would not make it smaller
+        """
+        if not text:
+            return text
+        zdict = self.dictionaries[self.current]
+        raw = text.encode("utf-8")
+        if zdict:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=zdict)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        data = bytes([self.current]) + compressor.compress(raw) + compressor.flush()
+        if len(data) >= len(raw):
+            return text
+        return data
+
+    def decompress(self, value):
+        """
+        Decompress a stored value
+
+        returns: text, values that are not compressed are returned unchanged
+        """
+        if not isinstance(value, bytes):
+            return value
+        if value[0] not in self.dictionaries and self.loader is not None:
+            self.dictionaries.update(self.loader())
+        zdict = self.dictionaries[value[0]]
+        if zdict:
+            decompressor = zlib.decompressobj(-15, zdict=zdict)
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return (decompressor.decompress(value[1:]) + decompressor.flush()).decode("utf-8")
+
+    def compress_row(self, word_obj: tuple) -> tuple:
+        """
+        Compress the text columns of a definition tuple without an id
+
+        returns: definition tuple ready to be inserted
+        """
+        word, title, explanation, examples, *rest = word_obj
+        return (word, title, self.compress(explanation), self.compress(examples), *rest)
+
+    def wrap_rows(self, rows: list) -> list:
+        """
+        Wrap database rows that have compressed columns so they decompress on access
+
+        returns: list of rows
+        """
+        return [
+            CompressedRow(row, self)
+            if any(isinstance(row[i], bytes) for i in COMPRESSED_COLUMNS) else row
+            for row in rows
+        ]
+
+class CompressedRow(Sequence):
+    """
+    Read-only definition row that decompresses its text columns only when they are accessed
+    """
+    __slots__ = ("_row", "_compressor")
+
+    def __init__(self, row: tuple, compressor: TextCompressor):
+        self._row = row
+        self._compressor = compressor
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self._row))))
+        return self._compressor.decompress(self._row[index])
+
+    def __len__(self):
+        return len(self._row)
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, CompressedRow)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(tuple(self))
@@ -0,0 +1,111 @@
+"""
+Concurrent update processing for urbaani_sanakirja_bot
+"""
+import asyncio
+import sys
+from collections import deque
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+def ordering_key(update: object):
+    """
+    Get the key of updates that must be processed in order
+
+    Updates for the same chat, or for the same inline message, share a key.
+    Inline queries have no key, superseded ones are cancelled by the handler instead.
+
+    returns: hashable key or None if the update can be processed in any order
+    """
+    if not isinstance(update, Update) or update.inline_query:
+        return None
+    query = update.callback_query
+    if query and query.inline_message_id:
+        return ("inline_message", query.inline_message_id)
+    if update.effective_chat:
+        return ("chat", update.effective_chat.id)
+    return None
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Update processor that handles updates concurrently up to a global limit,
+    while updates with the same ordering key are handled one at a time in arrival order
+
+    Updates waiting for an earlier update with the same key do not hold one of the
+    global slots, so a busy chat cannot starve the others.
+    """
+    __slots__ = ("_limit", "_queues", "_slots")
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        # the base class takes its slot before do_process_update, which would let updates
+        # waiting for their turn hold slots, so it gets a bound that is never reached
+        # and the limit is enforced by _slots once it is the update's turn
+        self._limit = sys.maxsize
+        super().__init__(sys.maxsize)
+        self._limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # key -> deque of futures of the updates waiting behind the one being processed
+        self._queues = {}
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        """
+        Maximum number of updates processed concurrently
+        """
+        return self._limit
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        """
+        Process update after all earlier updates with the same ordering key,
+        taking a slot only once it is its turn
+        """
+        key = ordering_key(update)
+        if key is not None:
+            await self._wait_turn(key)
+        try:
+            async with self._slots:
+                await coroutine
+        finally:
+            if key is not None:
+                self._next_turn(key)
+
+    async def _wait_turn(self, key):
+        """
+        Wait until all earlier updates with key have been processed
+        """
+        waiting = self._queues.get(key)
+        if waiting is None:
+            self._queues[key] = deque()
+            return
+        turn = asyncio.get_running_loop().create_future()
+        waiting.append(turn)
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # cancelled right after getting the turn, pass it on
+                self._next_turn(key)
+            raise
+
+    def _next_turn(self, key):
+        """
+        Give the turn to the next waiting update with key, skipping cancelled ones
+        """
+        waiting = self._queues[key]
+        while waiting:
+            turn = waiting.popleft()
+            if not turn.done():
+                turn.set_result(None)
+                return
+        del self._queues[key]
+
+    async def initialize(self) -> None:
+        """
+        Nothing to initialize
+        """
+
+    async def shutdown(self) -> None:
+        """
+        Nothing to shut down
+        """
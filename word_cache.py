@@ -0,0 +1,131 @@
+"""
+In-memory cache of word definitions and rendered replies for urbaani_sanakirja_bot
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from word_database import WordDatabase
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+class WordCache:
+    """
+    Bounded LRU cache of definitions and rendered replies keyed by word
+    """
+    def __init__(self, max_words: int = 2000):
+        self.max_words = max_words
+        self.entries = OrderedDict()
+
+    def get(self, word: str):
+        """
+        Get cached definitions for word
+
+        returns: list of definitions or None if word is not cached
+        """
+        entry = self.entries.get(word)
+        if entry is None:
+            return None
+        self.entries.move_to_end(word)
+        return entry[0]
+
+    def put(self, word: str, definitions: list):
+        """
+        Cache definitions for word, evicting the least recently used word if full
+        """
+        self.entries[word] = (definitions, {})
+        self.entries.move_to_end(word)
+        while len(self.entries) > self.max_words:
+            self.entries.popitem(last=False)
+
+    def get_reply(self, word: str, definitions: list, index: int, render) -> str:
+        """
+        Get a rendered reply for a definition, caching it if the definitions are cached
+
+        returns: rendered reply string
+        """
+        entry = self.entries.get(word)
+        if entry is None or entry[0] is not definitions:
+            return render(definitions[index])
+        replies = entry[1]
+        if index not in replies:
+            replies[index] = render(definitions[index])
+        return replies[index]
+
+    def words(self) -> list:
+        """
+        Return cached words, most recently used first
+        """
+        return list(reversed(self.entries))
+
+    def clear(self):
+        """
+        Remove all cached entries
+        """
+        self.entries.clear()
+
+    def replace(self, other: "WordCache"):
+        """
+        Take over the entries of another cache, eg. one warmed in a worker thread
+        """
+        self.entries = other.entries
+
+    def warm(self, db: WordDatabase, words: list, render=None, time_budget: float = 5.0) -> int:
+        """
+        Load definitions (and optionally rendered replies) for words into the cache
+
+        Loading stops once the cache is full or time_budget seconds have passed.
+
+        returns: number of words loaded
+        """
+        deadline = time.monotonic() + time_budget
+        loaded = []
+        for word in words[:self.max_words]:
+            if time.monotonic() > deadline:
+                logger.warning("Cache warm-up stopped after %d words, time budget exceeded",
+                               len(loaded))
+                break
+            definitions = db.get_definitions(word)
+            if not definitions:
+                continue
+            self.put(word, definitions)
+            if render is not None:
+                for index in range(len(definitions)):
+                    self.get_reply(word, definitions, index, render)
+            loaded.append(word)
+        # keep the hottest words at the most recently used end
+        for word in reversed(loaded):
+            self.entries.move_to_end(word)
+        return len(loaded)
+
+def save_snapshot(path: str, words: list):
+    """
+    Write the hot word set to a snapshot file atomically
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "created": int(time.time()), "words": words},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def load_snapshot(path: str, limit: int = None) -> list:
+    """
+    Read the hot word set from a snapshot file
+
+    returns: list of words, hottest first, or an empty list if the snapshot is unusable
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read cache snapshot %s: %s", path, e)
+        return []
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return []
+    words = [word for word in snapshot.get("words", []) if isinstance(word, str)]
+    return words[:limit] if limit is not None else words
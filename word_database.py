@@ -3,22 +3,68 @@ Class for interacting with the word dictionary database
 """
 import sqlite3
 import os
+import threading
+import time
+import unicodedata
 import dotenv
+from text_compression import TextCompressor, NO_DICTIONARY, train_dictionary
+
+# columns of a definition row, the lookup key column is not part of it
+DEFINITION_COLUMNS = ("id, word, title, explanation, examples, user, date, "
+                      "upvotes, downvotes, labels")
+
+# version of the lookup keys stored in the word_key column, kept in PRAGMA user_version
+WORD_KEY_VERSION = 2
+
+def normalize_word(word: str) -> str:
+    """
+    Normalize a word for lookups: NFC, casefolded and whitespace collapsed
+
+    returns: normalized lookup key
+    """
+    key = " ".join(unicodedata.normalize("NFC", word).casefold().split())
+    # casefolding can leave decomposed characters (eg. "İ" folds to "i" and a combining dot)
+    return unicodedata.normalize("NFC", key)
+
+def lookup_keys(word: str) -> list:
+    """
+    Keys to look a query up by: the normalized word and, for a query with stray
+    punctuation or spaces at either end, the key without them as a fallback
+
+    returns: list of one or two lookup keys, to be tried in order
+    """
+    key = normalize_word(word)
+    start, end = 0, len(key)
+    while start < end and unicodedata.category(key[start])[0] in "PZ":
+        start += 1
+    while end > start and unicodedata.category(key[end - 1])[0] in "PZ":
+        end -= 1
+    loose = key[start:end]
+    return [key, loose] if loose and loose != key else [key]
 
 class WordDatabase:
     """
     Database class for interacting with the word database
     """
-    def __init__(self, name='words.db'):
+    def __init__(self, name: str = None, compress: bool = None):
         dotenv.load_dotenv()
-        word_db = os.getenv("WORD_DATABASE")
-        if not word_db:
-            self.name = name
-        else:
-            self.name = word_db
-        self.conn = sqlite3.connect(self.name)
+        # a database given explicitly wins over the environment
+        self.name = name or os.getenv("WORD_DATABASE") or "words.db"
+        # lookups run in worker threads, the lock serializes access to the connection.
+        # scraper processes may write at the same time, so wait for their locks
+        self.conn = sqlite3.connect(self.name, timeout=30, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.lock = threading.Lock()
         self.create_table()
+        self.migrate_word_keys()
+        self.compressor = self.load_compressor()
+        if compress is None and os.getenv("WORD_DATABASE_COMPRESS") is not None:
+            compress = os.getenv("WORD_DATABASE_COMPRESS") == "1"
+        # by default compress once the database has been migrated to compressed text,
+        # also when the migration is run by another process while this one is up
+        self.follow_migration = compress is None
+        # compress explanations and examples of new definitions
+        self.compress = self.compressor.current != NO_DICTIONARY if compress is None else compress
 
     def create_table(self):
         """
@@ -38,24 +84,147 @@ class WordDatabase:
             labels TEXT,
             UNIQUE(word, title, explanation));
         ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lookups(
+            word TEXT PRIMARY KEY,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            last_seen INTEGER);
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries(
+            id INTEGER PRIMARY KEY CHECK (id BETWEEN 1 AND 255),
+            zdict BLOB NOT NULL);
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS known_links(
+            link TEXT PRIMARY KEY,
+            first_seen INTEGER);
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS page_fingerprints(
+            tab TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY(tab, page));
+        ''')
         self.conn.commit()
 
+    def migrate_word_keys(self):
+        """
+        Add the normalized lookup key column and its index, filling in missing keys
+        and recomputing keys written by an older version of normalize_word
+        """
+        self.cursor.execute('PRAGMA table_info(words)')
+        if "word_key" not in [column[1] for column in self.cursor.fetchall()]:
+            self.cursor.execute('ALTER TABLE words ADD COLUMN word_key TEXT')
+        self.conn.create_function("normalize_word", 1, normalize_word, deterministic=True)
+        self.cursor.execute('PRAGMA user_version')
+        if self.cursor.fetchone()[0] < WORD_KEY_VERSION:
+            self.cursor.execute('UPDATE words SET word_key = normalize_word(word)')
+            self.cursor.execute(f'PRAGMA user_version = {WORD_KEY_VERSION}')
+        else:
+            self.cursor.execute(
+                'UPDATE words SET word_key = normalize_word(word) WHERE word_key IS NULL'
+                )
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS words_word_key ON words(word_key)')
+        self.conn.commit()
+
+    def read_dictionaries(self) -> dict:
+        """
+        Read the text compression dictionaries stored in the database
+
+        returns: dict of dictionary id -> dictionary bytes
+        """
+        with self.lock:
+            self.cursor.execute('SELECT id, zdict FROM compression_dictionaries')
+            return dict(self.cursor.fetchall())
+
+    def load_compressor(self) -> TextCompressor:
+        """
+        Load the text compression dictionaries stored in the database
+
+        returns: TextCompressor using the newest dictionary, which reads dictionaries
+                 added later by other connections when it meets one it does not know
+        """
+        dictionaries = self.read_dictionaries()
+        current = max(dictionaries, default=NO_DICTIONARY)
+        return TextCompressor(dictionaries, current, loader=self.read_dictionaries)
+
+    def refresh_compressor(self):
+        """
+        Switch to a compression dictionary trained by another connection, eg. by
+        a compress migration run while the bot is up, so new definitions are
+        compressed the same way as the migrated ones and duplicates are still detected
+        """
+        with self.lock:
+            self.cursor.execute('SELECT MAX(id) FROM compression_dictionaries')
+            newest = self.cursor.fetchone()[0] or NO_DICTIONARY
+        if newest != self.compressor.current:
+            self.compressor = self.load_compressor()
+            if self.follow_migration:
+                self.compress = True
+
     def insert_definition(self, word_obj: tuple) -> bool:
         """
         Insert a new definition into the database
 
         returns: boolean indicating if the operation was a success
         """
+        self.refresh_compressor()
+        if self.compress:
+            word_obj = self.compressor.compress_row(word_obj)
         word, title, explanation, examples, user, date, upvotes, downvotes, labels = word_obj
-        try:
-            self.cursor.execute('''
-                INSERT INTO words (word, title, explanation, examples, user, date, upvotes, downvotes, labels)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (word, title, explanation, examples, user, date, upvotes, downvotes, labels))
+        with self.lock:
+            try:
+                self.cursor.execute('''
+                    INSERT INTO words (word, title, explanation, examples, user, date, upvotes, downvotes, labels, word_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (word, title, explanation, examples, user, date, upvotes, downvotes,
+                          labels, normalize_word(word)))
+                self.conn.commit()
+                return self.cursor.rowcount > 0
+            except sqlite3.Error:
+                return False
+
+    def insert_definitions(self, word_objs: list) -> int:
+        """
+        Insert many definitions in a single transaction, skipping duplicates
+
+        returns: number of definitions inserted
+        """
+        self.refresh_compressor()
+        if self.compress:
+            word_objs = [self.compressor.compress_row(word_obj) for word_obj in word_objs]
+        rows = [(*word_obj, normalize_word(word_obj[0]) if word_obj[0] else None)
+                for word_obj in word_objs]
+        with self.lock:
+            before = self.conn.total_changes
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO words (word, title, explanation, examples, user, date, upvotes, downvotes, labels, word_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
             self.conn.commit()
-            return self.cursor.rowcount > 0
-        except sqlite3.Error:
-            return False
+            return self.conn.total_changes - before
+
+    def iter_definitions(self, chunk_size: int = 1000):
+        """
+        Iterate over all database entries for words, reading chunk_size rows at a time
+
+        yields: definition tuples in id order
+        """
+        last_id = 0
+        while True:
+            with self.lock:
+                self.cursor.execute(
+                    f'SELECT {DEFINITION_COLUMNS} FROM words WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, chunk_size)
+                    )
+                rows = self.cursor.fetchall()
+            if not rows:
+                return
+            yield from self.compressor.wrap_rows(rows)
+            last_id = rows[-1][0]
 
     def get_all_definitions(self) -> list:
         """
@@ -63,21 +232,242 @@ class WordDatabase:
 
         returns: all definitions from the database
         """
-        self.cursor.execute('SELECT * from words')
-        return self.cursor.fetchall()
+        with self.lock:
+            self.cursor.execute(f'SELECT {DEFINITION_COLUMNS} FROM words')
+            return self.compressor.wrap_rows(self.cursor.fetchall())
 
     def get_definitions(self, word: str) -> list:
         """
-        Get definitions for word
+        Get definitions for word, matched by its normalized form (see lookup_keys)
+
+        returns: list of tuples containing word definitions,
+                 compressed text is decompressed only when accessed
+        """
+        with self.lock:
+            for key in lookup_keys(word):
+                # rows written without a key (eg. by older versions) are matched like before
+                self.cursor.execute(
+                    f'''SELECT {DEFINITION_COLUMNS} FROM words
+                    WHERE word_key = ? OR (word_key IS NULL AND word = ?) ORDER BY id''',
+                    (key, word.lower())
+                    )
+                rows = self.cursor.fetchall()
+                if rows:
+                    break
+            return self.compressor.wrap_rows(rows)
+
+    def train_compression(self, sample_size: int = 20000) -> int:
+        """
+        Train a new compression dictionary on a sample of the stored definitions
+
+        returns: id of the new dictionary
+        """
+        texts = []
+        for row in self.iter_definitions():
+            if len(texts) >= sample_size:
+                break
+            texts.append(row[3])
+            if row[4]:
+                texts.append(row[4])
+        zdict = train_dictionary(texts)
+        with self.lock:
+            self.cursor.execute(
+                'INSERT INTO compression_dictionaries (id, zdict) VALUES (?, ?)',
+                (self.compressor.current + 1, zdict)
+                )
+            self.conn.commit()
+        self.compressor = self.load_compressor()
+        return self.compressor.current
+
+    def compress_existing(self, chunk_size: int = 1000, retrain: bool = False,
+                          vacuum: bool = True) -> int:
+        """
+        Migrate stored definitions to compressed text using the current dictionary
+
+        A dictionary is trained first if there is none yet or retrain is set.
+        Rows already compressed with the current dictionary are left as they are.
+        Connections open in other processes, like the running bot, start compressing
+        new definitions on their next insert unless WORD_DATABASE_COMPRESS=0 is set.
+        A definition stored both as plain and compressed text is kept only once.
+
+        returns: number of definitions rewritten
+        """
+        self.refresh_compressor()
+        if retrain or self.compressor.current == NO_DICTIONARY:
+            self.train_compression()
+        updated = 0
+        last_id = 0
+        while True:
+            with self.lock:
+                self.cursor.execute(
+                    'SELECT id, explanation, examples FROM words WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, chunk_size)
+                    )
+                rows = self.cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            changes = []
+            for row_id, explanation, examples in rows:
+                new_explanation = self.compressor.compress(self.compressor.decompress(explanation))
+                new_examples = self.compressor.compress(self.compressor.decompress(examples))
+                if (new_explanation, new_examples) != (explanation, examples):
+                    changes.append((new_explanation, new_examples, row_id))
+            with self.lock:
+                self.cursor.executemany(
+                    'UPDATE OR REPLACE words SET explanation = ?, examples = ? WHERE id = ?',
+                    changes
+                    )
+                self.conn.commit()
+            updated += len(changes)
+        if vacuum:
+            with self.lock:
+                self.conn.execute('VACUUM')
+        self.compress = True
+        return updated
 
-        returns: list of tuples containing word definitions
+    def record_lookups(self, counts: list):
         """
-        word_lower = word.lower()
-        self.cursor.execute('SELECT * FROM words WHERE word = ?', (word_lower,))
-        return self.cursor.fetchall()
+        Add aggregated lookup counts to the lookup statistics table
+
+        counts: list of (word, hits, misses, last_seen) tuples
+        """
+        with self.lock:
+            self.cursor.executemany('''
+                INSERT INTO lookups (word, hits, misses, last_seen)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(word) DO UPDATE SET
+                    hits = hits + excluded.hits,
+                    misses = misses + excluded.misses,
+                    last_seen = MAX(last_seen, excluded.last_seen)
+                ''', counts)
+            self.conn.commit()
+
+    def get_hot_words(self, limit: int = 10) -> list:
+        """
+        Get the most frequently found words
+
+        returns: list of (word, hits, last_seen) tuples
+        """
+        with self.lock:
+            self.cursor.execute('''
+                SELECT word, hits, last_seen FROM lookups
+                WHERE hits > 0 ORDER BY hits DESC, last_seen DESC LIMIT ?
+                ''', (limit,))
+            return self.cursor.fetchall()
+
+    def get_top_misses(self, limit: int = 10) -> list:
+        """
+        Get the most frequently looked up words that were not found
+
+        returns: list of (word, misses, last_seen) tuples
+        """
+        with self.lock:
+            self.cursor.execute('''
+                SELECT word, misses, last_seen FROM lookups
+                WHERE misses > 0 ORDER BY misses DESC, last_seen DESC LIMIT ?
+                ''', (limit,))
+            return self.cursor.fetchall()
+
+    def add_known_links(self, links: list):
+        """
+        Remember word page links whose definitions have been scraped
+        """
+        with self.lock:
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO known_links (link, first_seen) VALUES (?, ?)',
+                [(link, int(time.time())) for link in links]
+                )
+            self.conn.commit()
+
+    def filter_new_links(self, links: list) -> list:
+        """
+        Drop word page links that have already been scraped
+
+        returns: links not seen before, in their original order
+        """
+        known = set()
+        with self.lock:
+            # stay well below the SQLite limit of bound parameters per statement
+            for start in range(0, len(links), 500):
+                chunk = links[start:start + 500]
+                self.cursor.execute(
+                    f'SELECT link FROM known_links WHERE link IN ({",".join("?" * len(chunk))})',
+                    chunk
+                    )
+                known.update(row[0] for row in self.cursor.fetchall())
+        return [link for link in links if link not in known]
+
+    def get_page_fingerprints(self, tab: str) -> dict:
+        """
+        Get the stored link set fingerprints of the browse pages of a tab
+
+        returns: dict of page number -> fingerprint
+        """
+        with self.lock:
+            self.cursor.execute(
+                'SELECT page, fingerprint FROM page_fingerprints WHERE tab = ?', (tab,)
+                )
+            return dict(self.cursor.fetchall())
+
+    def set_page_fingerprints(self, fingerprints: list):
+        """
+        Store link set fingerprints of browse pages
+
+        fingerprints: list of (tab, page, fingerprint) tuples
+        """
+        with self.lock:
+            self.cursor.executemany('''
+                INSERT INTO page_fingerprints (tab, page, fingerprint) VALUES (?, ?, ?)
+                ON CONFLICT(tab, page) DO UPDATE SET fingerprint = excluded.fingerprint
+                ''', fingerprints)
+            self.conn.commit()
+
+    def delete_page_fingerprints(self, tab: str, after_page: int):
+        """
+        Forget the fingerprints of the browse pages of a tab after after_page
+        """
+        with self.lock:
+            self.cursor.execute(
+                'DELETE FROM page_fingerprints WHERE tab = ? AND page > ?', (tab, after_page)
+                )
+            self.conn.commit()
+
+    def data_version(self) -> int:
+        """
+        Get a number that changes whenever another connection, eg. the standalone
+        scraper, commits to the database, commits of this connection do not change it
+
+        returns: data version of the database as seen by this connection
+        """
+        with self.lock:
+            self.cursor.execute('PRAGMA data_version')
+            return self.cursor.fetchone()[0]
 
     def close(self):
         """
         Close database connection
         """
         self.conn.close()
+
+def main():
+    """
+    Command line interface for database maintenance
+    """
+    # pylint: disable=import-outside-toplevel
+    import argparse
+    parser = argparse.ArgumentParser(description="Word database maintenance")
+    parser.add_argument("command", choices=["compress"])
+    parser.add_argument("--db", help="word database file (default: WORD_DATABASE or words.db)")
+    parser.add_argument("--retrain", action="store_true",
+                        help="train a new compression dictionary before compressing")
+    args = parser.parse_args()
+    database = WordDatabase(args.db)
+    size_before = os.path.getsize(database.name)
+    rewritten = database.compress_existing(retrain=args.retrain)
+    print(f"Compressed {rewritten} definitions, "
+          f"{size_before} -> {os.path.getsize(database.name)} bytes")
+    database.close()
+
+if __name__ == "__main__":
+    main()